@@ -0,0 +1,233 @@
+"""Benchmark suite of PolyMoment across distributions, variable counts, polynomial degrees and moment orders
+
+Every case runs in a fresh process with a time limit and is timed per phase with the instrumentation hooks of
+PolyMoment: parse, expand (sparse polynomial products), expectation (moment tables and their reduction) and
+simplify. Results are written as JSON; a run can be compared against a stored baseline to flag regressions.
+
+    python benchmark.py --output benchmark.json
+    python benchmark.py --quick --output new.json --baseline benchmark.json
+    python benchmark.py --compare benchmark.json new.json
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import sys
+import time
+
+from typing import Dict, List
+
+
+DISTRIBUTIONS = ['uniform', 'trapezoidal', 'triangular', 'beta', 'normal', 'student', 'laplace', 'gamma', 'weibull',
+                 'maxwell']
+TYPES = ['symmetrical', 'one_sided_right', 'one_sided_left']
+
+# shape parameters valid for every order up to 8 (student needs more degrees of freedom than the order)
+SHAPES = {
+    'trapezoidal': {'beta1': 0.5},
+    'beta': {'beta1': 2.0, 'beta2': 3.0},
+    'student': {'beta1': 20.0},
+    'gamma': {'beta1': 2.0},
+    'weibull': {'beta1': 1.5},
+}
+
+
+def make_poly(variables: int, degree: int, seed: int = 0) -> str:
+    """Deterministic polynomial in x0..x{variables-1} of the given degree
+
+    Every variable appears linearly, and as many monomials of degree 2..degree couple random pairs of variables.
+    """
+    rng = random.Random(seed * 1000 + variables * 10 + degree)
+    terms = [f'{rng.randint(1, 5)}*x{i}' for i in range(variables)]
+    for i in range(variables if degree > 1 else 0):
+        d = rng.randint(2, degree)
+        names = [f'x{i}', f'x{rng.randrange(variables)}']
+        factors = [names[rng.randrange(2)] for _ in range(d - 1)] + [names[0]]
+        terms.append(f'{rng.randint(1, 5)}*' + '*'.join(factors))
+    return ' + '.join(terms)
+
+
+def make_dist(variables: int, distribution: str, dist_type: str, symbolic: bool) -> Dict:
+    """Same distribution for every variable, with symbolic or numeric parameters"""
+    dist = {}
+    for i in range(variables):
+        if symbolic:
+            params = {'translation': f'm{i}', 'scale': f's{i}'}
+            params.update({k: f'{k[0]}{k[-1]}_{i}' for k in SHAPES.get(distribution, {})})
+        else:
+            params = {'translation': 0.5, 'scale': 1.5, **SHAPES.get(distribution, {})}
+        dist[f'x{i}'] = {'distribution': distribution, 'type': dist_type, **params}
+    return dist
+
+
+def make_cases(quick: bool = False) -> List[Dict]:
+    """Benchmark grid: distributions and types, variable counts and degrees, moment orders"""
+    sizes = [1, 2, 5] if quick else [1, 2, 5, 10, 20, 50]
+    degrees = [1, 2] if quick else [1, 2, 3, 4]
+    orders = range(1, 5) if quick else range(1, 9)
+
+    cases = []
+    for symbolic in [True, False]:
+        params = 'symbolic' if symbolic else 'numeric'
+        for distribution in DISTRIBUTIONS:
+            for dist_type in TYPES:
+                cases.append({'group': 'distribution', 'distribution': distribution, 'type': dist_type,
+                              'params': params, 'variables': 2, 'degree': 2, 'method': 'moment', 'order': 4})
+        for variables in sizes:
+            for degree in degrees:
+                cases.append({'group': 'size', 'distribution': 'normal', 'type': 'symmetrical', 'params': params,
+                              'variables': variables, 'degree': degree, 'method': 'moment', 'order': 2})
+        for order in orders:
+            cases.append({'group': 'order', 'distribution': 'uniform', 'type': 'symmetrical', 'params': params,
+                          'variables': 3, 'degree': 2, 'method': 'moment', 'order': order})
+        for variables in sizes[:4]:
+            cases.append({'group': 'kurt', 'distribution': 'normal', 'type': 'symmetrical', 'params': params,
+                          'variables': variables, 'degree': 2, 'method': 'kurt', 'order': None})
+
+    for case in cases:
+        order = f"{case['method']}{case['order'] or ''}"
+        case['name'] = f"{case['group']}/{case['distribution']}/{case['type']}/{case['params']}/" \
+                       f"v{case['variables']}/d{case['degree']}/{order}"
+    return cases
+
+
+def run_case(case: Dict, repeat: int = 1) -> Dict:
+    """Runs case repeat times in this process and keeps the fastest run"""
+    from instrumentation import Metrics
+    from polymoment import PolyMoment
+
+    poly = make_poly(case['variables'], case['degree'])
+    dist = make_dist(case['variables'], case['distribution'], case['type'], case['params'] == 'symbolic')
+    best = None
+    for _ in range(repeat):
+        metrics = Metrics()
+        start = time.perf_counter()
+        polymoment = PolyMoment(poly=poly, dist=dist, simplify='cheap', metrics=metrics)
+        if case['method'] == 'moment':
+            polymoment.moment(order=case['order'])
+        else:
+            getattr(polymoment, case['method'])()
+        total = time.perf_counter() - start
+        if best is None or total < best['total']:
+            phases = {'parse': 0.0, 'expand': 0.0, 'expectation': 0.0, 'simplify': 0.0, **metrics.phases}
+            best = {'total': total, 'phases': phases, 'counters': metrics.counters}
+    return best
+
+
+def _case_main(conn, case: Dict, repeat: int):
+    """Entry point of the process running a single case"""
+    try:
+        conn.send(('ok', run_case(case, repeat=repeat)))
+    except Exception as e:
+        conn.send(('error', repr(e)))
+
+
+def run_isolated(case: Dict, repeat: int, timeout: float) -> Dict:
+    """Runs case in a spawned process, killing it after timeout seconds"""
+    context = multiprocessing.get_context('spawn')
+    conn, child_conn = context.Pipe()
+    process = context.Process(target=_case_main, args=(child_conn, case, repeat), daemon=True)
+    process.start()
+    child_conn.close()
+
+    result = {**case, 'status': 'timeout', 'total': None, 'phases': {}}
+    if conn.poll(timeout):
+        try:
+            kind, value = conn.recv()
+        except EOFError:
+            kind, value = 'error', 'Benchmark process terminated unexpectedly'
+        if kind == 'ok':
+            result.update(status='ok', **value)
+        else:
+            result.update(status='error', error=value)
+    process.kill()
+    process.join()
+    conn.close()
+    return result
+
+
+def environment() -> Dict:
+    """Versions and machine the results were measured with"""
+    import numpy
+    import sympy
+    from polymoment import __version__
+
+    return {'polymoment': __version__, 'python': platform.python_version(), 'sympy': sympy.__version__,
+            'numpy': numpy.__version__, 'machine': platform.machine(), 'processor': platform.processor(),
+            'system': platform.system(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 1.5, min_seconds: float = 0.05) -> List[Dict]:
+    """Cases of current slower than baseline by more than threshold times and min_seconds, or no longer passing"""
+    previous = {r['name']: r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        before = previous.get(result['name'])
+        if before is None or before['status'] != 'ok':
+            continue
+        if result['status'] != 'ok':
+            regressions.append({'name': result['name'], 'baseline': before['total'], 'current': None,
+                                'ratio': None, 'status': result['status']})
+            continue
+        ratio = result['total'] / max(before['total'], 1e-9)
+        if ratio > threshold and result['total'] - before['total'] > min_seconds:
+            regressions.append({'name': result['name'], 'baseline': before['total'], 'current': result['total'],
+                                'ratio': ratio, 'status': result['status']})
+    return regressions
+
+
+def report(regressions: List[Dict]):
+    """Prints regressions found by compare"""
+    if not regressions:
+        print('No regressions')
+        return
+    print(f'{len(regressions)} regressions:')
+    for r in regressions:
+        if r['current'] is None:
+            print(f"  {r['name']}: {r['status']} (baseline {r['baseline']:.3f} s)")
+        else:
+            print(f"  {r['name']}: {r['baseline']:.3f} s -> {r['current']:.3f} s ({r['ratio']:.2f}x)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='JSON file to write results to')
+    parser.add_argument('--baseline', help='JSON results to flag regressions against')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help='compare two result files only')
+    parser.add_argument('--quick', action='store_true', help='small grid for a fast check')
+    parser.add_argument('--filter', default='', help='run only cases whose name contains this text')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case; the fastest is kept')
+    parser.add_argument('--timeout', type=float, default=60, help='time limit of a case in seconds')
+    parser.add_argument('--threshold', type=float, default=1.5, help='slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            regressions = compare(json.load(f), json.load(g), threshold=args.threshold)
+        report(regressions)
+        return 1 if regressions else 0
+
+    cases = [case for case in make_cases(quick=args.quick) if args.filter in case['name']]
+    results = []
+    for i, case in enumerate(cases):
+        result = run_isolated(case, repeat=args.repeat, timeout=args.timeout)
+        results.append(result)
+        total = f"{result['total']:.3f} s" if result['status'] == 'ok' else result['status']
+        print(f"[{i + 1}/{len(cases)}] {case['name']}: {total}", file=sys.stderr)
+
+    current = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), current, threshold=args.threshold)
+        report(regressions)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,8 @@
-from pydantic import BaseModel
-from typing import Dict, Union
+from pydantic import BaseModel, validator
+from typing import Dict, List, Union
+
+from polymoment import ENGINES, SIMPLIFY, STATISTICS
+from wireformat import FORMATS
 
 
 class Dist(BaseModel):
@@ -17,8 +20,127 @@ class RequestModel(BaseModel):
     poly: str
     dist: Dict[str, Dist]
     order: Union[int, None] = None
+    orders: Union[List[int], None] = None
+    simplify: str = 'cheap'
+    engine: str = 'exact'
+    samples: int = 65536
+    seed: Union[int, None] = None
+    format: str = 'text'
+
+    @validator('simplify')
+    def simplify_must_be_supported(cls, v):
+        if v not in SIMPLIFY:
+            raise ValueError(f'Simplification policy {v} is not supported')
+        return v
+
+    @validator('engine')
+    def engine_must_be_supported(cls, v):
+        if v not in ENGINES:
+            raise ValueError(f'Engine {v} is not supported')
+        return v
+
+    @validator('samples')
+    def samples_must_be_positive(cls, v):
+        if v < 2:
+            raise ValueError('Number of samples must be at least 2')
+        return v
+
+    @validator('format')
+    def format_must_be_supported(cls, v):
+        if v not in FORMATS:
+            raise ValueError(f'Result format {v} is not supported')
+        return v
+
+
+class VectorRequestModel(BaseModel):
+    """Vector of polynomials request data model"""
+    polys: List[str]
+    dist: Dict[str, Dist]
+    mixed: List[List[int]] = []
+    simplify: str = 'cheap'
+    format: str = 'text'
+
+    @validator('simplify')
+    def simplify_must_be_supported(cls, v):
+        if v not in SIMPLIFY:
+            raise ValueError(f'Simplification policy {v} is not supported')
+        return v
+
+    @validator('format')
+    def format_must_be_supported(cls, v):
+        if v not in FORMATS:
+            raise ValueError(f'Result format {v} is not supported')
+        return v
+
+    @validator('polys')
+    def polys_must_not_be_empty(cls, v):
+        if not v:
+            raise ValueError('At least one polynomial is required')
+        return v
+
+    @validator('mixed', each_item=True)
+    def mixed_must_be_index_pairs_and_orders(cls, v):
+        if len(v) != 4 or min(v) < 0:
+            raise ValueError('Mixed moments are given as [i, j, a, b] with non-negative entries')
+        return v
 
 
 class ResponseModel(BaseModel):
-    """Response data model"""
-    result: str
\ No newline at end of file
+    """Response data model; results are strings, or trees of wireformat.to_wire in the cse format"""
+    result: Union[str, Dict]
+    interval: Union[List[float], None] = None
+
+
+class StatsResponseModel(BaseModel):
+    """Statistics response data model"""
+    mean: Union[str, Dict]
+    var: Union[str, Dict]
+    std: Union[str, Dict]
+    skew: Union[str, Dict]
+    kurt: Union[str, Dict]
+    moments: Dict[int, Union[str, Dict]] = {}
+    intervals: Dict[str, List[float]] = {}
+
+
+class BatchItemModel(RequestModel):
+    """Batch entry data model"""
+    method: str
+
+    @validator('method')
+    def method_must_be_supported(cls, v):
+        if v not in STATISTICS:
+            raise ValueError(f'Method {v} is not supported')
+        return v
+
+
+class BatchRequestModel(BaseModel):
+    """Batch request data model"""
+    requests: List[BatchItemModel]
+
+
+class BatchResponseModel(BaseModel):
+    """Batch response data model"""
+    results: List[ResponseModel]
+
+
+class JobRequestModel(BatchItemModel):
+    """Job submission data model"""
+
+
+class JobModel(BaseModel):
+    """Job state data model"""
+    id: str
+    method: str
+    status: str
+    created: float
+    started: Union[float, None] = None
+    finished: Union[float, None] = None
+    error: Union[str, None] = None
+    submissions: int = 1
+
+
+class VectorResponseModel(BaseModel):
+    """Vector of polynomials response data model"""
+    mean: List[Union[str, Dict]]
+    cov: List[List[Union[str, Dict]]]
+    mixed: List[Union[str, Dict]] = []
@@ -0,0 +1,133 @@
+import contextlib
+import threading
+import time
+
+from typing import Dict, List
+
+
+# upper bounds of the request latency buckets in seconds
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200]
+
+# help text of counters and gauges; other names are described by the name itself
+HELP = {
+    'monomials': 'Monomials in the expanded powers whose expectation was taken',
+    'table_hits': 'Moment table entries reused',
+    'table_misses': 'Moment table entries computed',
+    'admission_fast': 'Computations admitted to the fast lane',
+    'admission_slow': 'Computations admitted to the slow lane',
+    'admission_rejected': 'Computations rejected for an estimated cost above the limit',
+    'model_cache_hits': 'Requests served by a model already built in the worker',
+    'model_cache_misses': 'Requests whose model was parsed and built',
+}
+
+
+class Metrics:
+    """Time per phase and counters recorded by PolyMoment, e.g. expanded monomials and moment table hits"""
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Adds the time spent in the with block to phase name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, n: int = 1):
+        """Adds n to counter name"""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self) -> Dict:
+        """Phases and counters as plain dicts"""
+        return {'phases': dict(self.phases), 'counters': dict(self.counters)}
+
+
+def server_timing(phases: Dict[str, float]) -> str:
+    """Server-Timing header value of phase durations given in seconds"""
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in phases.items())
+
+
+class ServiceMetrics:
+    """Request latencies, in-flight requests and computation totals of the backend, in Prometheus text format"""
+    def __init__(self, buckets: List[float] = None):
+        self.buckets = list(buckets or LATENCY_BUCKETS)
+        self.latency = {}
+        self.requests = {}
+        self.in_flight = 0
+        self.phases = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def track(self):
+        """Counts a request as in flight during the with block"""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def observe(self, method: str, status: int, seconds: float):
+        """Records the latency of a finished request"""
+        with self._lock:
+            counts, total, n = self.latency.get(method, ([0] * len(self.buckets), 0.0, 0))
+            counts = [c + (seconds <= bound) for c, bound in zip(counts, self.buckets)]
+            self.latency[method] = (counts, total + seconds, n + 1)
+            self.requests[(method, status)] = self.requests.get((method, status), 0) + 1
+
+    def record(self, metrics: Dict):
+        """Adds phases and counters of Metrics.as_dict() to the totals"""
+        with self._lock:
+            for name, seconds in metrics.get('phases', {}).items():
+                self.phases[name] = self.phases.get(name, 0.0) + seconds
+            for name, n in metrics.get('counters', {}).items():
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def render(self, gauges: Dict[str, float] = None, counters: Dict[str, float] = None) -> str:
+        """Prometheus text exposition of the metrics, plus extra gauges and counters given by name"""
+        with self._lock:
+            lines = _header('polymoment_request_duration_seconds', 'histogram', 'Request latency by method')
+            for method, (counts, total, n) in sorted(self.latency.items()):
+                label = f'method="{_escape(method)}"'
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f'polymoment_request_duration_seconds_bucket{{{label},le="{bound:g}"}} {count}')
+                lines.append(f'polymoment_request_duration_seconds_bucket{{{label},le="+Inf"}} {n}')
+                lines.append(f'polymoment_request_duration_seconds_sum{{{label}}} {total:.6f}')
+                lines.append(f'polymoment_request_duration_seconds_count{{{label}}} {n}')
+
+            lines += _header('polymoment_requests_total', 'counter', 'Finished requests by method and status')
+            for (method, status), n in sorted(self.requests.items()):
+                lines.append(f'polymoment_requests_total{{method="{_escape(method)}",status="{status}"}} {n}')
+
+            lines += _header('polymoment_requests_in_flight', 'gauge', 'Requests being served')
+            lines.append(f'polymoment_requests_in_flight {self.in_flight}')
+
+            lines += _header('polymoment_phase_seconds_total', 'counter', 'Computation time by phase')
+            for name, seconds in sorted(self.phases.items()):
+                lines.append(f'polymoment_phase_seconds_total{{phase="{_escape(name)}"}} {seconds:.6f}')
+
+            for name, n in sorted({**self.counters, **(counters or {})}.items()):
+                lines += _header(f'polymoment_{name}_total', 'counter', _help(name))
+                lines.append(f'polymoment_{name}_total {n}')
+            for name, value in sorted((gauges or {}).items()):
+                lines += _header(f'polymoment_{name}', 'gauge', _help(name))
+                lines.append(f'polymoment_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _header(name: str, kind: str, help: str) -> List[str]:
+    return [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+
+
+def _help(name: str) -> str:
+    return HELP.get(name, name.replace('_', ' ').capitalize())
+
+
+def _escape(value: str) -> str:
+    """Escapes a Prometheus label value"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,135 @@
+import asyncio
+import time
+import uuid
+
+from typing import Awaitable, Callable, Dict, Union
+
+
+# states of a job; the last three are final
+STATES = ['queued', 'running', 'done', 'failed', 'cancelled']
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are already queued or running"""
+
+
+class Job:
+    """Computation submitted to a JobQueue, with its state and, once finished, its result or error"""
+    def __init__(self, key: str, method: str):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.method = method
+        self.status = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.submissions = 1
+        self.task = None
+
+    @property
+    def final(self) -> bool:
+        return self.status in ['done', 'failed', 'cancelled']
+
+    def as_dict(self) -> Dict:
+        return {k: getattr(self, k) for k in ['id', 'method', 'status', 'created', 'started', 'finished', 'error',
+                                              'submissions']}
+
+
+class JobQueue:
+    """Bounded queue of background jobs, deduplicated on a canonical request key
+
+    A submission whose key matches a job that is queued, running or done attaches to that job instead of starting a
+    new one. At most concurrency jobs run at once and at most max_jobs may be queued or running; finished jobs are
+    forgotten ttl seconds after they finish.
+    """
+    def __init__(self, max_jobs: int = 64, concurrency: int = 1, ttl: float = 3600):
+        self.max_jobs = max_jobs
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.jobs = {}
+        self.keys = {}
+        self.coalesced = 0
+        self._slots = None
+
+    def submit(self, key: str, method: str, fn: Callable[[], Awaitable]) -> Job:
+        """Starts fn() as a background job, or returns the live job with the same key"""
+        self.purge()
+        if key in self.keys:
+            job = self.jobs[self.keys[key]]
+            job.submissions += 1
+            self.coalesced += 1
+            return job
+
+        if sum(not job.final for job in self.jobs.values()) >= self.max_jobs:
+            raise QueueFull
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+
+        job = Job(key=key, method=method)
+        self.jobs[job.id] = job
+        self.keys[key] = job.id
+        job.task = asyncio.ensure_future(self._run(job, fn))
+        return job
+
+    def get(self, job_id: str) -> Union[Job, None]:
+        self.purge()
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Union[Job, None]:
+        """Withdraws one submission of a queued or running job; the job is cancelled when none are left"""
+        job = self.get(job_id)
+        if job is not None and not job.final:
+            job.submissions -= 1
+            if job.submissions <= 0:
+                job.task.cancel()
+                self._finish(job, 'cancelled')
+        return job
+
+    def purge(self):
+        """Forgets jobs that finished more than ttl seconds ago"""
+        now = time.time()
+        for job in [job for job in self.jobs.values() if job.final and now - job.finished > self.ttl]:
+            del self.jobs[job.id]
+            if self.keys.get(job.key) == job.id:
+                del self.keys[job.key]
+
+    def shutdown(self):
+        for job in list(self.jobs.values()):
+            if not job.final:
+                job.task.cancel()
+                self._finish(job, 'cancelled')
+
+    def stats(self) -> Dict:
+        """Job counts by state and the number of submissions attached to an existing job"""
+        self.purge()
+        counts = {state: 0 for state in STATES}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return {**counts, 'coalesced': self.coalesced}
+
+    async def _run(self, job: Job, fn: Callable[[], Awaitable]):
+        try:
+            async with self._slots:
+                job.status = 'running'
+                job.started = time.time()
+                result = await fn()
+        except asyncio.CancelledError:
+            self._finish(job, 'cancelled')
+        except Exception as e:
+            # HTTP errors carry their message in detail
+            job.error = str(getattr(e, 'detail', None) or e)
+            self._finish(job, 'failed')
+        else:
+            job.result = result
+            self._finish(job, 'done')
+
+    def _finish(self, job: Job, status: str):
+        if job.final:
+            return
+        job.status = status
+        job.finished = time.time()
+        # only successful results are shared with later submissions
+        if status != 'done' and self.keys.get(job.key) == job.id:
+            del self.keys[job.key]
@@ -0,0 +1,357 @@
+"""Load test of the PolyMoment backend under concurrent mixed traffic
+
+Starts main_backend:app the way PolyMomentBackend.service serves it (gunicorn with UvicornH11Worker), replays a
+weighted mix of /mean/, /var/, /skew/, /kurt/ and /moment/ requests built from RequestModel fixtures of several
+polynomial sizes at a fixed concurrency, and reports throughput, p50/p95/p99 latency, error and timeout rates and the
+peak memory of the server processes. Results are written as JSON so runs can be compared.
+
+    python loadtest.py --concurrency 8 --duration 60 --output load.json
+    python loadtest.py --url http://127.0.0.1:8123 --mix mean=1,kurt=1 --sizes 2,10 --requests 200
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from benchmark import environment, make_dist, make_poly
+
+
+METHODS = ['mean', 'var', 'skew', 'kurt', 'moment']
+
+# default share of each endpoint in the traffic, and the order asked of /moment/
+MIX = {'mean': 4, 'var': 3, 'skew': 1, 'kurt': 1, 'moment': 1}
+MOMENT_ORDER = 3
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Endpoint weights from 'mean=4,var=3,...'"""
+    mix = {}
+    for item in text.split(','):
+        method, _, weight = item.partition('=')
+        if method not in METHODS:
+            raise ValueError(f'Method {method} is not supported')
+        mix[method] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('The mix needs at least one method with a positive weight')
+    return mix
+
+
+def make_fixtures(sizes: List[int], degree: int = 2, distribution: str = 'normal') -> Dict[int, str]:
+    """Request bodies by number of variables, validated by RequestModel"""
+    from datamodel import RequestModel
+
+    fixtures = {}
+    for variables in sizes:
+        request = RequestModel(poly=make_poly(variables, degree), dist=make_dist(variables, distribution,
+                                                                                'symmetrical', symbolic=True))
+        fixtures[variables] = request.json(exclude_none=True)
+    return fixtures
+
+
+def start_server(bind: str, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    """Starts gunicorn serving main_backend:app with the worker class of PolyMomentBackend.service"""
+    command = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-k', 'uvicorn.workers.UvicornH11Worker',
+               '-b', bind, '-t', '1200', '--keep-alive', '1200', 'main_backend:app']
+    return subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)), env={**os.environ, **env},
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def wait_ready(url: str, server: subprocess.Popen = None, timeout: float = 60):
+    """Polls GET / until the backend answers"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f'Server exited at startup: {server.stderr.read().decode()[-2000:]}')
+        try:
+            status, _ = request(url, 'GET', '/', timeout=1)
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f'Backend at {url} did not start within {timeout:g} s')
+
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def request(url: str, method: str, path: str, body: str = None, timeout: float = 60,
+            connection: http.client.HTTPConnection = None) -> Tuple[int, bytes]:
+    """Sends a single request, reusing connection when given"""
+    if connection is None:
+        parts = urllib.parse.urlsplit(url)
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    connection.request(method, path, body=body, headers=headers)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid and all its descendants, read from /proc"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # the process name may contain spaces, so fields are counted after its closing parenthesis
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def rss(pid: int) -> int:
+    """Resident memory of a process in bytes, 0 once it has exited"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class MemorySampler(threading.Thread):
+    """Samples the memory of a server process tree, keeping the peak of its total and of every process"""
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_total = 0
+        self.peak = {}
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.sample()
+            self._done.wait(self.interval)
+
+    def sample(self):
+        total = 0
+        for pid in process_tree(self.pid):
+            value = rss(pid)
+            total += value
+            self.peak[pid] = max(self.peak.get(pid, 0), value)
+        self.peak_total = max(self.peak_total, total)
+        self.samples += 1
+
+    def stop(self) -> Dict:
+        self._done.set()
+        self.join()
+        self.sample()
+        return {'peak_total_rss': self.peak_total, 'peak_rss': {str(k): v for k, v in sorted(self.peak.items())},
+                'processes': len(self.peak), 'samples': self.samples}
+
+
+def run_load(url: str, fixtures: Dict[int, str], mix: Dict[str, float], concurrency: int, duration: float = None,
+             requests: int = None, timeout: float = 60, seed: int = 0) -> Tuple[List[Dict], float]:
+    """Sends mixed requests from concurrency clients until duration seconds pass or requests are sent
+
+    Every client keeps its own connection open and reconnects after a failure. Returns one record per request and
+    the wall time of the run.
+    """
+    parts = urllib.parse.urlsplit(url)
+    methods, weights = list(mix), list(mix.values())
+    sizes = list(fixtures)
+    records = []
+    lock = threading.Lock()
+    sent = [0]
+    start = time.perf_counter()
+
+    def take() -> bool:
+        with lock:
+            if requests is not None and sent[0] >= requests:
+                return False
+            if duration is not None and time.perf_counter() - start >= duration:
+                return False
+            sent[0] += 1
+            return True
+
+    def client(index: int):
+        rng = random.Random(seed * 1000 + index)
+        connection = None
+        while take():
+            method, size = rng.choices(methods, weights)[0], rng.choice(sizes)
+            body = fixtures[size]
+            if method == 'moment':
+                body = json.dumps({**json.loads(body), 'order': MOMENT_ORDER})
+            if connection is None:
+                connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+
+            began = time.perf_counter()
+            try:
+                status, _ = request(url, 'POST', f'/{method}/', body=body, connection=connection)
+                outcome = 'ok' if status == 200 else 'timeout' if status == 504 else 'error'
+            except socket.timeout:
+                status, outcome = None, 'timeout'
+            except (OSError, http.client.HTTPException):
+                status, outcome = None, 'error'
+            latency = time.perf_counter() - began
+            if outcome != 'ok':
+                connection.close()
+                connection = None
+
+            with lock:
+                records.append({'method': method, 'variables': size, 'status': status, 'outcome': outcome,
+                                'latency': latency, 'end': began + latency - start})
+        if connection is not None:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(client, i) for i in range(concurrency)]:
+            future.result()
+    return records, time.perf_counter() - start
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of values, None when there are none"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def summarize(records: List[Dict], elapsed: float) -> Dict:
+    """Throughput, latency percentiles of successful requests, and error and timeout rates"""
+    total = len(records)
+    latencies = [r['latency'] for r in records if r['outcome'] == 'ok']
+    return {
+        'requests': total,
+        'ok': len(latencies),
+        'throughput': len(latencies) / elapsed if elapsed > 0 else None,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies) if latencies else None,
+        'error_rate': sum(r['outcome'] == 'error' for r in records) / total if total else 0.0,
+        'timeout_rate': sum(r['outcome'] == 'timeout' for r in records) / total if total else 0.0,
+        'statuses': dict(sorted(Counter(str(r['status']) for r in records).items())),
+    }
+
+
+def report(result: Dict):
+    """Prints the summary of a run"""
+    def ms(value):
+        return '-' if value is None else f'{1000 * value:.0f} ms'
+
+    rows = [('all', result['summary'])] + list(result['by_method'].items()) + \
+        [(f'v{k}', v) for k, v in result['by_size'].items()]
+    print(f"{'':>8} {'requests':>9} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7} {'timeouts':>9}")
+    for name, s in rows:
+        throughput = '-' if s['throughput'] is None else f"{s['throughput']:.2f}"
+        print(f"{name:>8} {s['requests']:>9} {throughput:>8} {ms(s['p50']):>9} {ms(s['p95']):>9} {ms(s['p99']):>9} "
+              f"{s['error_rate']:>7.1%} {s['timeout_rate']:>9.1%}")
+    if result.get('memory'):
+        memory = result['memory']
+        print(f"peak RSS {memory['peak_total_rss'] / 2 ** 20:.0f} MiB over {memory['processes']} processes")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='load an already running backend instead of starting one')
+    parser.add_argument('--bind', default='127.0.0.1:8124', help='address of the started backend')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers of the started backend')
+    parser.add_argument('--pool-workers', type=int, help='POLYMOMENT_WORKERS of the started backend')
+    parser.add_argument('--cache', action='store_true', help='keep the result cache of the started backend enabled')
+    parser.add_argument('--concurrency', type=int, default=4, help='clients sending requests at once')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to send requests for')
+    parser.add_argument('--requests', type=int, help='stop after this many requests instead of after --duration')
+    parser.add_argument('--mix', default=','.join(f'{k}={v}' for k, v in MIX.items()), help='endpoint weights')
+    parser.add_argument('--sizes', default='1,2,5,10', help='numbers of variables of the polynomials sent')
+    parser.add_argument('--degree', type=int, default=2, help='degree of the polynomials sent')
+    parser.add_argument('--timeout', type=float, default=60, help='client time limit of a request in seconds')
+    parser.add_argument('--warmup', type=int, default=1, help='requests per endpoint and size sent before measuring')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the request sequence')
+    parser.add_argument('--output', help='JSON file to write results to')
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    fixtures = make_fixtures([int(s) for s in args.sizes.split(',')], degree=args.degree)
+
+    server = None
+    url = args.url
+    if url is None:
+        # results are cached by request, so without --cache every request is computed
+        env = {} if args.cache else {'POLYMOMENT_CACHE_PATH': '', 'POLYMOMENT_CACHE_SIZE': '0'}
+        if args.pool_workers:
+            env['POLYMOMENT_WORKERS'] = str(args.pool_workers)
+        url = f'http://{args.bind}'
+        try:
+            request(url, 'GET', '/', timeout=1)
+        except OSError:
+            pass
+        else:
+            # the new server could not bind, and the load would go to the one already listening
+            raise RuntimeError(f'Address {args.bind} is already in use; pass --url to load a running backend')
+        server = start_server(args.bind, args.workers, env)
+    sampler = None
+    try:
+        wait_ready(url, server)
+        if args.warmup:
+            # worker processes import sympy and build their moment tables on first use
+            run_load(url, fixtures, mix, concurrency=1, requests=args.warmup * len(mix) * len(fixtures),
+                     timeout=args.timeout, seed=args.seed + 1)
+        if server is not None:
+            sampler = MemorySampler(server.pid)
+            sampler.start()
+        duration = None if args.requests else args.duration
+        records, elapsed = run_load(url, fixtures, mix, args.concurrency, duration=duration, requests=args.requests,
+                                    timeout=args.timeout, seed=args.seed)
+    finally:
+        try:
+            memory = sampler.stop() if sampler is not None else None
+        finally:
+            if server is not None:
+                stop_server(server)
+
+    result = {
+        'environment': environment(),
+        'config': {'url': url, 'workers': args.workers if server else None, 'pool_workers': args.pool_workers,
+                   'cache': args.cache or server is None, 'concurrency': args.concurrency, 'duration': duration,
+                   'requests': args.requests, 'mix': mix, 'sizes': list(fixtures), 'degree': args.degree,
+                   'timeout': args.timeout, 'seed': args.seed},
+        'elapsed': elapsed,
+        'summary': summarize(records, elapsed),
+        'by_method': {m: summarize([r for r in records if r['method'] == m], elapsed) for m in mix},
+        'by_size': {str(v): summarize([r for r in records if r['variables'] == v], elapsed) for v in fixtures},
+        'memory': memory,
+        'records': records,
+    }
+    report(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0 if result['summary']['ok'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,35 +1,433 @@
-from fastapi import FastAPI
+import json
+import os
+import sympy
+import time
 
-from polymoment import PolyMoment
-from datamodel import RequestModel, ResponseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from typing import Dict, List
+
+from polymoment import STATISTIC_ORDERS, PolyMoment, PolyMomentVector, __version__, time_class
+from datamodel import (
+    BatchRequestModel, BatchResponseModel, JobModel, JobRequestModel, RequestModel, ResponseModel, StatsResponseModel,
+    VectorRequestModel, VectorResponseModel
+)
+from instrumentation import Metrics, ServiceMetrics, server_timing
+from jobs import JobQueue, QueueFull
+from modelcache import ModelCache
+from momentregistry import load_snapshot
+from polyparser import InvalidPolynomial
+from resultcache import ResultCache, model_key, request_key, vector_key
+from wireformat import format_result
+from workerpool import PoolBusy, TaskTimeout, WorkerPool
 
 
 app = FastAPI(
     title='PolyMoment',
     description='A REST API for calculating high-order moments of multivariate polynomials',
-    version='1.0.0'
+    version=__version__
 )
 
+# result cache; an empty POLYMOMENT_CACHE_PATH keeps the cache in memory only
+CACHE_PATH = os.environ.get('POLYMOMENT_CACHE_PATH', 'polymoment_cache.sqlite3')
+CACHE_SIZE = int(os.environ.get('POLYMOMENT_CACHE_SIZE', 1024))
+
+# worker processes running the computations, and the time budget of a single request in seconds
+WORKERS = int(os.environ.get('POLYMOMENT_WORKERS', 2))
+MAX_TASKS_PER_CHILD = int(os.environ.get('POLYMOMENT_MAX_TASKS_PER_CHILD', 50))
+MAX_QUEUE = int(os.environ.get('POLYMOMENT_MAX_QUEUE', 16))
+TIMEOUT = float(os.environ.get('POLYMOMENT_TIMEOUT', 1200))
+
+# admission control: requests of estimated cost up to FAST_COST run on a separate pool of FAST_WORKERS workers, so
+# they never wait behind long computations; requests estimated above MAX_COST are rejected. See
+# PolyMoment.estimate_cost; 0 FAST_WORKERS runs everything on one pool and 0 MAX_COST accepts every request
+FAST_WORKERS = int(os.environ.get('POLYMOMENT_FAST_WORKERS', 1))
+FAST_COST = float(os.environ.get('POLYMOMENT_FAST_COST', 1e4))
+MAX_COST = float(os.environ.get('POLYMOMENT_MAX_COST', 0))
+
+# chunk of monomials streamed at a time when expanding powers; 0 expands every power in full
+CHUNK_SIZE = int(os.environ.get('POLYMOMENT_CHUNK_SIZE', 0))
+
+# parallel shards of large powers within one computation; worker processes are daemonic and cannot start process
+# pools, so shards run on a local Ray runtime unless POLYMOMENT_SHARD_PARALLEL says otherwise. 0 disables sharding
+SHARD_WORKERS = int(os.environ.get('POLYMOMENT_SHARD_WORKERS', 0))
+SHARD_PARALLEL = os.environ.get('POLYMOMENT_SHARD_PARALLEL', 'ray')
+
+# built models kept by every worker process, so repeated models skip parsing and reuse warm moment tables
+MODEL_CACHE_SIZE = int(os.environ.get('POLYMOMENT_MODEL_CACHE_SIZE', 64))
+
+# snapshot of standardised moments loaded by every worker at startup; see momentregistry.py
+MOMENT_SNAPSHOT = os.environ.get('POLYMOMENT_MOMENT_SNAPSHOT', '')
+
+# responses at least this many bytes long are gzip-compressed for clients that accept it
+GZIP_MIN_SIZE = int(os.environ.get('POLYMOMENT_GZIP_MIN_SIZE', 1024))
+
+# background jobs: number queued or running at once, and seconds a finished job is kept
+JOB_QUEUE = int(os.environ.get('POLYMOMENT_JOB_QUEUE', 64))
+JOB_TTL = float(os.environ.get('POLYMOMENT_JOB_TTL', 3600))
+
 polymoment_handle = None
 
+# models of the worker process this module is loaded in
+MODELS = ModelCache(max_size=MODEL_CACHE_SIZE)
 
-class PolymomentDeployment:
-    async def remote(self, request: dict, method: str) -> dict:
-        polymoment = PolyMoment(poly=request.get('poly'), dist=request.get('dist'))
-        if method == 'moment':
-            return {'result': polymoment.moment(order=request.get('order')).__str__()}
-        elif method == 'mean':
-            return {'result': polymoment.mean().__str__()}
-        elif method == 'std':
-            return {'result': polymoment.std().__str__()}
-        elif method == 'var':
-            return {'result': polymoment.var().__str__()}
-        elif method == 'skew':
-            return {'result': polymoment.skew().__str__()}
-        elif method == 'kurt':
-            return {'result': polymoment.kurt().__str__()}
+
+def build(request: dict, metrics: Metrics = None) -> PolyMoment:
+    """Builds the PolyMoment described by request, or reuses the one built for the same model"""
+    key = model_key(request)
+    polymoment = MODELS.get(key)
+    if metrics is not None:
+        metrics.count('model_cache_hits' if polymoment is not None else 'model_cache_misses')
+    if polymoment is None:
+        dist = request.get('dist')
+        if request.get('engine') == 'approximate':
+            # sampling needs numbers, while distribution parameters arrive as strings
+            dist = {k: {name: _number(value) for name, value in dict(v).items()} for k, v in dist.items()}
+        polymoment = PolyMoment(poly=request.get('poly'), dist=dist, simplify=request.get('simplify'),
+                                metrics=metrics, chunk_size=CHUNK_SIZE or None, workers=SHARD_WORKERS or None,
+                                parallel=SHARD_PARALLEL)
+        MODELS.set(key, polymoment)
+    # phases and counters go to the metrics of the current request
+    polymoment.metrics = metrics
+    return polymoment
+
+
+def _number(value):
+    """value as a float when it parses as one, else unchanged"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def compute(request: dict, method: str) -> dict:
+    """Computes method of the PolyMoment described by request; runs in a worker process"""
+    return compute_batch(requests=[request], methods=[method])[0]
+
+
+def compute_timed(requests: List[dict], methods: List[str]) -> tuple:
+    """compute_batch, also returning the phase timings and counters of the computation"""
+    metrics = Metrics()
+    return compute_batch(requests=requests, methods=methods, metrics=metrics), metrics.as_dict()
+
+
+def compute_batch(requests: List[dict], methods: List[str], metrics: Metrics = None) -> List[dict]:
+    """Computes methods[i] of requests[i], sharing one PolyMoment between requests with the same model"""
+    groups = {}
+    for index, request in enumerate(requests):
+        groups.setdefault(model_key(request), []).append(index)
+
+    results = [None] * len(requests)
+    for indices in groups.values():
+        if requests[indices[0]].get('engine') == 'approximate':
+            approximations = compute_approximate(requests=[requests[i] for i in indices],
+                                                 methods=[methods[i] for i in indices], metrics=metrics)
+            for i, result in zip(indices, approximations):
+                results[i] = result
+            continue
+
+        polymoment = build(requests[indices[0]], metrics=metrics)
+        wanted = set(methods[i] for i in indices)
+
+        # kurt needs every central moment up to order 4, so the other statistics come along; skew alone stops at 3
+        stats = {}
+        if wanted & {'stats', 'kurt'}:
+            stats = polymoment.stats()
+        elif 'skew' in wanted:
+            stats['skew'] = polymoment.skew()
+        for method in wanted & {'mean', 'var', 'std'}:
+            if method not in stats:
+                stats[method] = getattr(polymoment, method)()
+
+        orders = [requests[i].get('order') for i in indices if methods[i] == 'moment']
+        orders += [order for i in indices if methods[i] == 'stats' for order in requests[i].get('orders') or []]
+        moments = polymoment.moments(orders=orders)
+
+        for i in indices:
+            fmt = requests[i].get('format')
+            if methods[i] == 'moment':
+                results[i] = {'result': format_result(moments[requests[i].get('order')], fmt)}
+            elif methods[i] == 'stats':
+                results[i] = {k: format_result(v, fmt) for k, v in stats.items()
+                              if k in ['mean', 'var', 'std', 'skew', 'kurt']}
+                results[i]['moments'] = {order: format_result(moments[order], fmt)
+                                         for order in requests[i].get('orders') or []}
+            elif methods[i] in stats:
+                results[i] = {'result': format_result(stats[methods[i]], fmt)}
+            else:
+                raise NotImplementedError(f"Method {methods[i]} is not implemented")
+    return results
+
+
+def estimate_batch(requests: List[dict], methods: List[str]) -> List[dict]:
+    """Estimated cost of compute_batch(requests, methods), one estimate per shared model; runs in a worker process
+
+    Approximate requests take a single sampling pass and are not estimated.
+    """
+    groups = {}
+    for index, request in enumerate(requests):
+        if request.get('engine') != 'approximate':
+            groups.setdefault(model_key(request), []).append(index)
+
+    estimates = []
+    for indices in groups.values():
+        polymoment = build(requests[indices[0]])
+        wanted = set(methods[i] for i in indices)
+        # central moments up to the highest order the statistics need, 4 for stats; raw moments for the rest
+        central = max([STATISTIC_ORDERS.get(m, 4) for m in wanted - {'mean', 'moment'}], default=0)
+        orders = [requests[i].get('order') or 0 for i in indices if methods[i] == 'moment']
+        orders += [order for i in indices if methods[i] == 'stats' for order in requests[i].get('orders') or []]
+        parts = [polymoment.estimate_cost(max(orders + [int('mean' in wanted)]))]
+        if central:
+            parts.append(polymoment.estimate_cost(central, central=True))
+        cost = sum(part['cost'] for part in parts)
+        estimates.append({'monomials': sum(part['monomials'] for part in parts), 'cost': cost,
+                          'time_class': time_class(cost)})
+    return estimates
+
+
+def compute_approximate(requests: List[dict], methods: List[str], metrics: Metrics = None) -> List[dict]:
+    """Estimates methods[i] of requests[i], which share one model, from a single quasi-Monte-Carlo sample"""
+    orders = [r.get('order') for r, m in zip(requests, methods) if m == 'moment']
+    orders += [order for r, m in zip(requests, methods) if m == 'stats' for order in r.get('orders') or []]
+    max_order = max(orders + [STATISTIC_ORDERS.get(m, 4 if m == 'stats' else 0) for m in methods])
+    polymoment = build(requests[0], metrics=metrics)
+    sampled = polymoment.sample_moments(max_order=max_order, samples=requests[0].get('samples'),
+                                        seed=requests[0].get('seed'))
+
+    results = []
+    for request, method in zip(requests, methods):
+        if method == 'stats':
+            estimates = {k: sampled.estimate(method=k) for k in ['mean', 'var', 'std', 'skew', 'kurt']}
+            moments = {order: sampled.estimate(method='moment', order=order) for order in request.get('orders') or []}
+            result = {k: e['value'].__str__() for k, e in estimates.items()}
+            result['moments'] = {order: e['value'].__str__() for order, e in moments.items()}
+            result['intervals'] = {str(k): [e['low'], e['high']] for k, e in {**estimates, **moments}.items()}
         else:
-            raise NotImplementedError(f"Method {method} is not implemented")
+            e = sampled.estimate(method=method, order=request.get('order'))
+            result = {'result': e['value'].__str__(), 'interval': [e['low'], e['high']]}
+        results.append(result)
+    return results
+
+
+def compute_vector(request: dict) -> dict:
+    """Computes the mean vector, covariance matrix and mixed moments of a vector of polynomials; runs in a worker"""
+    vector = PolyMomentVector(polys=request.get('polys'), dist=request.get('dist'), simplify=request.get('simplify'))
+    fmt = request.get('format')
+    return {
+        'mean': [format_result(mean, fmt) for mean in vector.mean()],
+        'cov': [[format_result(c, fmt) for c in row] for row in vector.cov()],
+        'mixed': [format_result(vector.mixed_moment(i, j, a, b), fmt) for i, j, a, b in request.get('mixed') or []],
+    }
+
+
+def stream_moments(request: dict, orders: List[int]):
+    """Yields the moments of the PolyMoment described by request in increasing order; runs in a worker process"""
+    start = time.perf_counter()
+    polymoment = build(request)
+    if request.get('engine') == 'approximate':
+        sampled = polymoment.sample_moments(max_order=max(orders), samples=request.get('samples'),
+                                            seed=request.get('seed'))
+        for order in sorted(set(orders)):
+            e = sampled.estimate(method='moment', order=order)
+            yield {'order': order, 'result': e['value'].__str__(), 'interval': [e['low'], e['high']],
+                   'elapsed': time.perf_counter() - start}
+        return
+
+    for order, moment in polymoment.iter_moments(orders=orders):
+        yield {'order': order, 'result': format_result(moment, request.get('format')),
+               'elapsed': time.perf_counter() - start}
+
+
+class PolymomentDeployment:
+    def __init__(self):
+        self.cache = ResultCache(path=CACHE_PATH, max_size=CACHE_SIZE, version=__version__)
+        self.pool = WorkerPool(size=WORKERS, max_tasks_per_child=MAX_TASKS_PER_CHILD, max_queue=MAX_QUEUE,
+                               timeout=TIMEOUT, initializer=load_snapshot, initargs=(MOMENT_SNAPSHOT,))
+        self.fast_pool = None
+        if FAST_WORKERS:
+            self.fast_pool = WorkerPool(size=FAST_WORKERS, max_tasks_per_child=MAX_TASKS_PER_CHILD,
+                                        max_queue=MAX_QUEUE, timeout=TIMEOUT, initializer=load_snapshot,
+                                        initargs=(MOMENT_SNAPSHOT,))
+        # streams and vectors always run in the slow lane
+        self.lanes = {'fast': self.fast_pool or self.pool, 'slow': self.pool}
+        self.metrics = ServiceMetrics()
+        # jobs wait here rather than in the pool queue, so a burst of submissions is not rejected with 503
+        self.jobs = JobQueue(max_jobs=JOB_QUEUE, concurrency=WORKERS, ttl=JOB_TTL)
+
+    async def remote(self, request: dict, method: str, phases: Dict = None) -> dict:
+        return (await self.remote_batch(requests=[request], methods=[method], phases=phases))[0]
+
+    async def remote_batch(self, requests: List[dict], methods: List[str], phases: Dict = None) -> List[dict]:
+        """Serves cached results and computes the others; phases receives the timings reported in Server-Timing"""
+        phases = {} if phases is None else phases
+        start = time.perf_counter()
+        keys = [request_key(request=r, method=m, version=__version__) for r, m in zip(requests, methods)]
+        results = [self.cache.get(key) for key in keys]
+        phases['cache'] = time.perf_counter() - start
+
+        # entries missing from the cache are computed together in one worker task
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            lane = await self.admit(requests=[requests[i] for i in missing], methods=[methods[i] for i in missing],
+                                    phases=phases)
+            start = time.perf_counter()
+            computed, metrics = await self.run(compute_timed, [requests[i] for i in missing],
+                                               [methods[i] for i in missing], lane=lane)
+            phases['compute'] = time.perf_counter() - start
+            phases.update(metrics['phases'])
+            self.metrics.record(metrics)
+            for i, result in zip(missing, computed):
+                self.cache.set(keys[i], result)
+                results[i] = result
+        return results
+
+    async def admit(self, requests: List[dict], methods: List[str], phases: Dict = None) -> str:
+        """Lane of the computation of methods of requests; rejects it when its estimated cost exceeds MAX_COST"""
+        if any(method == 'moment' and request.get('order') is None for request, method in zip(requests, methods)):
+            raise HTTPException(status_code=422, detail='Moment requests require an order')
+        if self.fast_pool is None and not MAX_COST:
+            return 'slow'
+        if all(request.get('engine') == 'approximate' for request in requests):
+            return 'fast'
+
+        # estimating parses the polynomials, which is left to a worker as for every other computation
+        start = time.perf_counter()
+        estimates = await self.run(estimate_batch, requests, methods, lane='fast')
+        if phases is not None:
+            phases['estimate'] = time.perf_counter() - start
+        cost = sum(estimate['cost'] for estimate in estimates)
+        if MAX_COST and cost > MAX_COST:
+            self.metrics.record({'counters': {'admission_rejected': 1}})
+            monomials = sum(estimate['monomials'] for estimate in estimates)
+            raise HTTPException(status_code=422, detail=(
+                f'Estimated cost {cost:.3g} ({monomials} monomials, {time_class(cost)}) exceeds the limit of '
+                f'{MAX_COST:g}; lower the order or use the approximate engine'
+            ))
+        lane = 'fast' if cost <= FAST_COST else 'slow'
+        self.metrics.record({'counters': {f'admission_{lane}': 1}})
+        return lane
+
+    def submit(self, request: dict, method: str):
+        """Starts method of request as a background job, attaching to an identical job that is running or done"""
+        key = request_key(request=request, method=method, version=__version__)
+        try:
+            return self.jobs.submit(key=key, method=method, fn=lambda: self.remote(request=request, method=method))
+        except QueueFull:
+            raise HTTPException(status_code=503, detail='Too many jobs are queued')
+
+    def job(self, job_id: str):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f'Job {job_id} does not exist or has expired')
+        return job
+
+    async def remote_vector(self, request: dict, phases: Dict = None) -> dict:
+        """Serves the joint moments of a vector of polynomials from the cache or a worker"""
+        phases = {} if phases is None else phases
+        key = vector_key(request=request, version=__version__)
+        result = self.cache.get(key)
+        if result is None:
+            start = time.perf_counter()
+            result = await self.run(compute_vector, request)
+            phases['compute'] = time.perf_counter() - start
+            self.cache.set(key, result)
+        return result
+
+    async def remote_stream(self, request: dict, orders: List[int], http_request: Request = None):
+        """Yields NDJSON lines of moments as they are computed; stops the computation when the client disconnects"""
+        stream = self.pool.stream(stream_moments, request, orders)
+        try:
+            async for item in stream:
+                if http_request is not None and await http_request.is_disconnected():
+                    break
+                key = request_key(request={**request, 'order': item['order']}, method='moment', version=__version__)
+                self.cache.set(key, {k: v for k, v in item.items() if k in ['result', 'interval']})
+                yield json.dumps(item) + '\n'
+        except TaskTimeout:
+            yield json.dumps({'error': f'Computation exceeded the time budget of {TIMEOUT:g} s'}) + '\n'
+        except PoolBusy:
+            yield json.dumps({'error': 'Too many requests are waiting for a worker'}) + '\n'
+        except InvalidPolynomial as e:
+            yield json.dumps({'error': f'Invalid polynomial: {e}'}) + '\n'
+        except Exception as e:
+            # headers are already sent, so errors of the computation end the stream as its last line
+            yield json.dumps({'error': str(e)}) + '\n'
+        finally:
+            await stream.aclose()
+
+    async def run(self, fn, *args, lane: str = 'slow'):
+        """Runs fn in the worker pool of lane, translating pool errors into HTTP errors"""
+        try:
+            return await self.lanes[lane].run(fn, *args)
+        except TaskTimeout:
+            raise HTTPException(status_code=504, detail=f'Computation exceeded the time budget of {TIMEOUT:g} s')
+        except PoolBusy:
+            raise HTTPException(status_code=503, detail='Too many requests are waiting for a worker')
+        except (InvalidPolynomial, sympy.PolynomialError) as e:
+            # the polynomial is parsed in the worker, so malformed input surfaces here
+            raise HTTPException(status_code=422, detail=f'Invalid polynomial: {e}')
+        except ValueError as e:
+            # invalid parameters found by the computation, e.g. an output index or a moment order out of range
+            raise HTTPException(status_code=422, detail=str(e))
+
+
+class InstrumentationMiddleware:
+    """Records latency and in-flight count of every request and adds a Server-Timing header
+
+    Endpoints report phase timings in request.state.phases, which shares the ASGI scope with this middleware.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.routes = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or polymoment_handle is None:
+            return await self.app(scope, receive, send)
+
+        if self.routes is None:
+            self.routes = {route.path for route in app.routes}
+        method = (scope['path'].strip('/') or 'root') if scope['path'] in self.routes else 'other'
+        phases = scope.setdefault('state', {})['phases'] = {}
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                headers = MutableHeaders(scope=message)
+                headers.append('Server-Timing', server_timing({**phases, 'total': time.perf_counter() - start}))
+            await send(message)
+
+        metrics = polymoment_handle.metrics
+        with metrics.track():
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                metrics.observe(method=method, status=status, seconds=time.perf_counter() - start)
+
+
+class CompressionMiddleware:
+    """Gzip-compresses responses for clients sending Accept-Encoding: gzip, except on the paths in exclude
+
+    Streams are excluded, since the compressor would hold their lines back until its buffer fills.
+    """
+    def __init__(self, app, minimum_size: int = 1024, exclude: List[str] = ()):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] not in self.exclude:
+            return await self.gzip(scope, receive, send)
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(CompressionMiddleware, minimum_size=GZIP_MIN_SIZE, exclude=['/moments/stream/'])
+app.add_middleware(InstrumentationMiddleware)
 
 
 @app.on_event("startup")
@@ -38,36 +436,133 @@ async def startup_event():
     polymoment_handle = PolymomentDeployment()
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    polymoment_handle.jobs.shutdown()
+    polymoment_handle.pool.shutdown()
+    if polymoment_handle.fast_pool is not None:
+        polymoment_handle.fast_pool.shutdown()
+
+
 @app.get("/")
 async def get_moment():
-    return {'status': 'ok'}
+    fast_pool = polymoment_handle.fast_pool
+    return {'status': 'ok', 'pool': polymoment_handle.pool.stats(), 'fast_pool': fast_pool and fast_pool.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    cache = polymoment_handle.cache.stats()
+    pool = polymoment_handle.pool.stats()
+    fast_pool = polymoment_handle.fast_pool and polymoment_handle.fast_pool.stats()
+    counters = {f'cache_{k}': cache[k] for k in ['hits', 'memory_hits', 'disk_hits', 'misses']}
+    jobs = polymoment_handle.jobs.stats()
+    counters['jobs_coalesced'] = jobs.pop('coalesced')
+    gauges = {**{f'cache_{k}': cache[k] for k in ['memory_size', 'disk_size']},
+              **{f'pool_{k}': v for k, v in pool.items()},
+              **{f'fast_pool_{k}': v for k, v in (fast_pool or {}).items()},
+              **{f'jobs_{k}': v for k, v in jobs.items()}}
+    return PlainTextResponse(polymoment_handle.metrics.render(gauges=gauges, counters=counters),
+                             media_type='text/plain; version=0.0.4')
+
+
+@app.get("/cache/")
+async def cache_stats():
+    return polymoment_handle.cache.stats()
+
+
+@app.delete("/cache/")
+async def cache_clear():
+    polymoment_handle.cache.clear()
+    return polymoment_handle.cache.stats()
 
 
 @app.post("/moment/", response_model=ResponseModel)
-async def moment(request: RequestModel):
-    return await polymoment_handle.remote(request=request.dict(), method='moment')
+async def moment(request: RequestModel, http_request: Request):
+    return await polymoment_handle.remote(request=request.dict(), method='moment', phases=http_request.state.phases)
 
 
 @app.post("/mean/", response_model=ResponseModel)
-async def mean(request: RequestModel):
-    return await polymoment_handle.remote(request=request.dict(), method='mean')
+async def mean(request: RequestModel, http_request: Request):
+    return await polymoment_handle.remote(request=request.dict(), method='mean', phases=http_request.state.phases)
 
 
 @app.post("/std/", response_model=ResponseModel)
-async def std(request: RequestModel):
-    return await polymoment_handle.remote(request=request.dict(), method='std')
+async def std(request: RequestModel, http_request: Request):
+    return await polymoment_handle.remote(request=request.dict(), method='std', phases=http_request.state.phases)
 
 
 @app.post("/var/", response_model=ResponseModel)
-async def var(request: RequestModel):
-    return await polymoment_handle.remote(request=request.dict(), method='var')
+async def var(request: RequestModel, http_request: Request):
+    return await polymoment_handle.remote(request=request.dict(), method='var', phases=http_request.state.phases)
 
 
 @app.post("/skew/", response_model=ResponseModel)
-async def skew(request: RequestModel):
-    return await polymoment_handle.remote(request=request.dict(), method='skew')
+async def skew(request: RequestModel, http_request: Request):
+    return await polymoment_handle.remote(request=request.dict(), method='skew', phases=http_request.state.phases)
 
 
 @app.post("/kurt/", response_model=ResponseModel)
-async def kurt(request: RequestModel):
-    return await polymoment_handle.remote(request=request.dict(), method='kurt')
+async def kurt(request: RequestModel, http_request: Request):
+    return await polymoment_handle.remote(request=request.dict(), method='kurt', phases=http_request.state.phases)
+
+
+@app.post("/stats/", response_model=StatsResponseModel)
+async def stats(request: RequestModel, http_request: Request):
+    return await polymoment_handle.remote(request=request.dict(), method='stats', phases=http_request.state.phases)
+
+
+@app.post("/batch/", response_model=BatchResponseModel)
+async def batch(request: BatchRequestModel, http_request: Request):
+    requests = [item.dict(exclude={'method'}) for item in request.requests]
+    methods = [item.method for item in request.requests]
+    results = await polymoment_handle.remote_batch(requests=requests, methods=methods,
+                                                   phases=http_request.state.phases)
+    return {'results': results}
+
+
+@app.post("/vector/", response_model=VectorResponseModel)
+async def vector(request: VectorRequestModel, http_request: Request):
+    return await polymoment_handle.remote_vector(request=request.dict(), phases=http_request.state.phases)
+
+
+@app.post("/moments/stream/")
+async def moments_stream(request: RequestModel, http_request: Request):
+    request = request.dict()
+    orders = request.get('orders') or list(range(1, (request.get('order') or 4) + 1))
+    if MAX_COST:
+        # rejected before the response starts, so the client gets the error status
+        await polymoment_handle.admit(requests=[{**request, 'order': max(orders)}], methods=['moment'],
+                                      phases=http_request.state.phases)
+    return StreamingResponse(
+        polymoment_handle.remote_stream(request=request, orders=orders, http_request=http_request),
+        media_type='application/x-ndjson'
+    )
+
+
+@app.post("/jobs/", response_model=JobModel, status_code=202)
+async def submit_job(request: JobRequestModel):
+    job = polymoment_handle.submit(request=request.dict(exclude={'method'}), method=request.method)
+    return job.as_dict()
+
+
+@app.get("/jobs/{job_id}", response_model=JobModel)
+async def job_status(job_id: str):
+    return polymoment_handle.job(job_id).as_dict()
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = polymoment_handle.job(job_id)
+    if job.status == 'done':
+        return job.result
+    if job.status in ['failed', 'cancelled']:
+        raise HTTPException(status_code=409, detail=job.error or f'Job {job_id} was cancelled')
+    # not finished yet; poll the status until it is
+    return JSONResponse(status_code=202, content=job.as_dict())
+
+
+@app.delete("/jobs/{job_id}", response_model=JobModel)
+async def cancel_job(job_id: str):
+    polymoment_handle.job(job_id)
+    return polymoment_handle.jobs.cancel(job_id).as_dict()
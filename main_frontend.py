@@ -1,7 +1,75 @@
+import hashlib
+import json
 import streamlit as st
 import pandas as pd
 import requests
 
+from requests.adapters import HTTPAdapter
+
+BASE_URL = 'http://127.0.0.1:8123/'
+STATISTICS = {'mean': 'Mean', 'var': 'Variance', 'std': 'Standard deviation', 'skew': 'Skewness', 'kurt': 'Kurtosis'}
+
+
+@st.experimental_singleton
+def get_session() -> requests.Session:
+    """HTTP session shared by every browser session, reusing connections to the backend"""
+    session = requests.Session()
+    session.mount(BASE_URL, HTTPAdapter(pool_connections=1, pool_maxsize=8))
+    return session
+
+
+def request_key(polymoment_input: dict, method: str) -> str:
+    """Canonical key of a backend request; the order only matters for moments"""
+    payload = {k: v for k, v in polymoment_input.items() if k != 'order' or method == 'moment'}
+    payload['poly'] = payload['poly'].replace(' ', '')
+    return hashlib.sha256(json.dumps([payload, method], sort_keys=True).encode()).hexdigest()
+
+
+def cached_result(polymoment_input: dict, method: str):
+    """Result of method cached in this session, also looking at statistics fetched together by /stats/"""
+    results = st.session_state.results
+    key = request_key(polymoment_input, method)
+    if key in results:
+        return results[key]
+    if method in STATISTICS:
+        stats = results.get(request_key(polymoment_input, 'stats'))
+        if stats is not None:
+            return stats[method]
+    return None
+
+
+def post(polymoment_input: dict, method: str):
+    """Result of method from the session cache or the backend; None when the backend fails"""
+    result = cached_result(polymoment_input, method)
+    if result is None:
+        r = get_session().post(BASE_URL + f'{method}/', json=polymoment_input)
+        if r.status_code != 200:
+            return None
+        result = r.json() if method == 'stats' else r.json().get('result')
+        st.session_state.results[request_key(polymoment_input, method)] = result
+    return result
+
+
+def stream_moments(polymoment_input: dict, order: int):
+    """Moment of order, streaming the lower orders from the backend to show progress; None when it fails"""
+    orders = [k for k in range(1, order + 1) if cached_result({**polymoment_input, 'order': k}, 'moment') is None]
+    if orders:
+        progress = st.progress(0)
+        with get_session().post(BASE_URL + 'moments/stream/', json={**polymoment_input, 'orders': orders},
+                                stream=True) as r:
+            if r.status_code != 200:
+                return None
+            for line in r.iter_lines():
+                item = json.loads(line)
+                if 'error' in item:
+                    return None
+                key = request_key({**polymoment_input, 'order': item['order']}, 'moment')
+                st.session_state.results[key] = item['result']
+                progress.progress(item['order'] / order)
+        progress.empty()
+    return cached_result(polymoment_input, 'moment')
+
+
 st.header("PolyMoment: High-order Moments of Multivariate Polynomials")
 
 # ---------------------------------------------------------------------------------------------------------------------
@@ -128,15 +196,20 @@ with st.form(key="Moment order form", clear_on_submit=False):
 
     # you can insert code for a list comprehension here to change the data (rwdta)
     # values into integer / float, if required
-    cols = st.columns(5)
+    cols = st.columns(6)
     buttons = [
         cols[0].form_submit_button(label='Moment'),
         cols[1].form_submit_button(label='Mean'),
         cols[2].form_submit_button(label='Variance'),
         cols[3].form_submit_button(label='Skewness'),
         cols[4].form_submit_button(label='Kurtosis'),
+        cols[5].form_submit_button(label='All statistics'),
     ]
 
+    # results of this browser session, keyed on the canonical request
+    if "results" not in st.session_state:
+        st.session_state.results = {}
+
     if any(buttons) and not expression:
         st.error('Please provide a polynomial expression')
     elif any(buttons) and st.session_state.df.shape[0] == 0:
@@ -144,49 +217,34 @@ with st.form(key="Moment order form", clear_on_submit=False):
     else:
         error_message = 'Something went wrong. Please check the variables and polynomial expression.'
         spinner_message = 'Wait for it...'
-        base_url = 'http://127.0.0.1:8123/'
         if buttons[0]:
+            polymoment_input = build_polymoment_input(order=moment_order)
             with st.spinner(spinner_message):
-                polymoment_input = build_polymoment_input(order=moment_order)
-                r = requests.post(base_url + 'moment/', json=polymoment_input)
+                if moment_order > 0:
+                    result = stream_moments(polymoment_input, order=moment_order)
+                else:
+                    result = post(polymoment_input, method='moment')
 
-            if r.status_code == 200:
-                st.text_area('Moment', value=r.json().get('result'), disabled=False, label_visibility="collapsed")
+            if result is not None:
+                st.text_area('Moment', value=result, disabled=False, label_visibility="collapsed")
             else:
                 st.error(error_message)
-        elif buttons[1]:
+        elif any(buttons[1:5]):
+            method = ['mean', 'var', 'skew', 'kurt'][buttons[1:5].index(True)]
             with st.spinner(spinner_message):
-                polymoment_input = build_polymoment_input()
-                r = requests.post(base_url + 'mean/', json=polymoment_input)
+                result = post(build_polymoment_input(), method=method)
 
-            if r.status_code == 200:
-                st.text_area('Mean', value=r.json().get('result'), disabled=False, label_visibility="collapsed")
+            if result is not None:
+                st.text_area(STATISTICS[method], value=result, disabled=False, label_visibility="collapsed")
             else:
                 st.error(error_message)
-        elif buttons[2]:
+        elif buttons[5]:
+            # every statistic from a single backend call
             with st.spinner(spinner_message):
-                polymoment_input = build_polymoment_input()
-                r = requests.post(base_url + 'var/', json=polymoment_input)
+                stats = post(build_polymoment_input(), method='stats')
 
-            if r.status_code == 200:
-                st.text_area('Variance', value=r.json().get('result'), disabled=False, label_visibility="collapsed")
+            if stats is not None:
+                for method, label in STATISTICS.items():
+                    st.text_area(label, value=stats[method], disabled=False)
             else:
                 st.error(error_message)
-        elif buttons[3]:
-            with st.spinner(spinner_message):
-                polymoment_input = build_polymoment_input()
-                r = requests.post(base_url + 'skew/', json=polymoment_input)
-
-            if r.status_code == 200:
-                st.text_area('Skewness', value=r.json().get('result'), disabled=False, label_visibility="collapsed")
-            else:
-                st.error(error_message, r.err)
-        elif buttons[4]:
-            with st.spinner(spinner_message):
-                polymoment_input = build_polymoment_input()
-                r = requests.post(base_url + 'kurt/', json=polymoment_input)
-
-            if r.status_code == 200:
-                st.text_area('Kurtosis', value=r.json().get('result'), disabled=False, label_visibility="collapsed")
-            else:
-                st.error(error_message)
\ No newline at end of file
@@ -0,0 +1,46 @@
+import threading
+
+from collections import OrderedDict
+from typing import Dict
+
+
+class ModelCache:
+    """LRU cache of built models, e.g. PolyMoment instances keyed on resultcache.model_key, with hit/miss counters
+
+    A reused model keeps its parsed polynomial, validated distributions, moment tables and compiled statistics, so
+    repeated requests skip parsing and validation and start from warm tables. Entries live in one process only.
+    """
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: str):
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, model):
+        with self._lock:
+            self.entries[key] = model
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters, size and size limit"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'max_size': self.max_size}
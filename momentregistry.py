@@ -0,0 +1,118 @@
+import argparse
+import os
+import pickle
+import threading
+
+from collections import OrderedDict
+from typing import Callable, Tuple
+
+
+class MomentRegistry:
+    """Thread-safe store of the standardised moments E[Z^k] shared by every MomentTable of the process
+
+    Entries are keyed on (distribution, type, beta1, beta2, lognormal scale); MomentTable replaces symbolic
+    parameters with placeholder symbols in the key, so one entry serves every request of a distribution family.
+    Numeric shape parameters are part of the key, so the least recently used entries are evicted beyond max_size.
+    Snapshots of the registry can be saved to disk and loaded when a worker starts.
+    """
+    version = 1
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        # key -> (half-moments, standardised moments), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def moments(self, key: Tuple, order: int, next_half_moment: Callable, adjust_symmetry: Callable) -> Tuple:
+        """Half-moments and standardised moments of key up to order, computing missing entries by recurrence
+
+        next_half_moment(k, half) returns e_k given e_0..e_{k-1}, and adjust_symmetry(e_k, k) returns E[Z^k].
+        """
+        with self._lock:
+            half, standard = self._entries.setdefault(key, ([], []))
+            self._entries.move_to_end(key)
+            if len(standard) > order:
+                self.hits += 1
+            else:
+                self.misses += 1
+                while len(half) <= order:
+                    k = len(half)
+                    half.append(next_half_moment(k, half))
+                    standard.append(adjust_symmetry(half[k], k))
+                self._evict()
+            return half[:order + 1], standard[:order + 1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def save(self, path: str):
+        """Writes a snapshot of every entry to path"""
+        with self._lock:
+            data = {'version': self.version, 'entries': {k: (list(h), list(s)) for k, (h, s) in self._entries.items()}}
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def load(self, path: str):
+        """Merges a snapshot written by save, keeping the longer list of every entry"""
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        if data.get('version') != self.version:
+            raise ValueError(f'Moment snapshot {path} has version {data.get("version")}, expected {self.version}')
+
+        with self._lock:
+            for key, (half, standard) in data['entries'].items():
+                if len(standard) > len(self._entries.get(key, ([], []))[1]):
+                    self._entries[key] = (list(half), list(standard))
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+# registry shared by every MomentTable of the process
+REGISTRY = MomentRegistry()
+
+# distribution families precomputed into snapshots
+DISTRIBUTIONS = ['uniform', 'trapezoidal', 'triangular', 'beta', 'normal', 'student', 'laplace', 'gamma', 'weibull',
+                 'maxwell']
+
+
+def load_snapshot(path: str):
+    """Loads a snapshot into the process-wide registry; meant as a worker initializer"""
+    if path and os.path.exists(path):
+        REGISTRY.load(path)
+
+
+def precompute(order: int):
+    """Fills the process-wide registry up to order for every distribution and type with symbolic parameters"""
+    from momenttable import SHAPES, MomentTable
+    from polyvar import PolyVar
+
+    for distribution in DISTRIBUTIONS:
+        # only the shape parameters of the family, so that keys match those of real requests
+        shape = {name: f'b{name[-1]}' for name in SHAPES.get(distribution, []) if name.startswith('beta')}
+        for dist_type in ['symmetrical', 'one_sided_right', 'one_sided_left']:
+            params = PolyVar(distribution=distribution, type=dist_type, translation='m', scale='s', **shape)
+            MomentTable(params, max_order=max(order, MomentTable.max_order)).grow(order)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precomputes standardised moments and saves a registry snapshot')
+    parser.add_argument('path', help='snapshot file to write')
+    parser.add_argument('--order', type=int, default=32, help='highest moment order to precompute')
+    args = parser.parse_args()
+
+    # MomentTable fills the registry of the imported module, not the one of this script
+    import momentregistry
+    momentregistry.precompute(args.order)
+    momentregistry.REGISTRY.save(args.path)
+    print(f'Saved {len(momentregistry.REGISTRY)} distributions up to order {args.order} to {args.path}')
@@ -0,0 +1,160 @@
+import math
+import sympy
+
+from momentregistry import REGISTRY, MomentRegistry
+from polyvar import PolyVar
+
+
+# stand-ins for symbolic shape parameters in registry keys and entries
+PLACEHOLDERS = {name: sympy.Symbol(f'_{name}') for name in ['beta1', 'beta2', 'scale']}
+
+# shape parameters the standardised moments of each distribution depend on; others are left out of registry keys
+SHAPES = {
+    'trapezoidal': ['beta1'], 'tra': ['beta1'],
+    'beta': ['beta1', 'beta2'], 'bet': ['beta1', 'beta2'],
+    'student': ['beta1'], 'stu': ['beta1'],
+    'gamma': ['beta1'], 'gam': ['beta1'],
+    'weibull': ['beta1'], 'wei': ['beta1'],
+    'lognormal': ['scale'], 'logn': ['scale'],
+}
+
+
+class MomentTable:
+    """Raw moments E[V^k], k = 0..K, of a random variable V = translation + scale * Z, grown incrementally
+
+    Standardised moments E[Z^k] are built with the recurrence of each distribution (tables 3.1 and 3.2 in
+    thesis), so every new entry costs O(1) on top of the entries already in the table, and are shared through a
+    process-wide MomentRegistry. Raw moments follow from the binomial expansion of (translation + scale * Z)^k.
+    """
+    max_order = 256
+
+    def __init__(self, params: PolyVar, max_order: int = None, registry: MomentRegistry = None):
+        self.params = params
+        if max_order is not None:
+            self.max_order = max_order
+        self.registry = REGISTRY if registry is None else registry
+
+        # shape parameters of the standardised moments, symbolic ones replaced by placeholders for the registry
+        self.shape = {}
+        self._substitutions = {}
+        for name in SHAPES.get(params.distribution, []):
+            value = getattr(params, name)
+            if isinstance(value, sympy.Basic):
+                self._substitutions[PLACEHOLDERS[name]] = value
+                value = PLACEHOLDERS[name]
+            self.shape[name] = value
+        self.key = (params.distribution, params.type, *(self.shape.get(name) for name in ['beta1', 'beta2', 'scale']))
+
+        # half-moments e_k of the one-sided standard distribution, E[Z^k] after symmetry, E[(V - translation)^k]
+        # and E[V^k]
+        self.half = []
+        self.standard = []
+        self.central = []
+        self.raw = []
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __getitem__(self, k: int):
+        self.grow(k)
+        return self.raw[k]
+
+    def centered(self, k: int):
+        """Returns E[(V - translation)^k]"""
+        self.grow(k)
+        return self.central[k]
+
+    def __repr__(self):
+        return f'MomentTable(distribution={self.params.distribution!r}, type={self.params.type!r}, ' \
+               f'order={len(self) - 1})'
+
+    def grow(self, order: int):
+        """Extends the table up to E[V^order]"""
+        if order > self.max_order:
+            raise ValueError(f'Moment order {order} exceeds the table limit of {self.max_order}')
+
+        if len(self.raw) > order:
+            return
+        half, standard = self.registry.moments(self.key, order, self._next_half_moment, self._adjust_symmetry)
+
+        while len(self.raw) <= order:
+            k = len(self.raw)
+            self.half.append(self._substitute(half[k]))
+            self.standard.append(self._substitute(standard[k]))
+
+            # binomial expansion of (translation + scale * Z)^k
+            mu, scale = self.params.translation, self._scale()
+            self.central.append((scale ** k) * self.standard[k])
+            raw = 0
+            for j in range(k + 1):
+                if self.standard[j] == 0:
+                    continue
+                raw = raw + math.comb(k, j) * (mu ** (k - j)) * (scale ** j) * self.standard[j]
+            self.raw.append(raw)
+
+    def _scale(self):
+        """Scale factor of Z; lognormal moments carry their scale in the standardised moments"""
+        return 1 if self.params.distribution in ['lognormal', 'logn'] else self.params.scale
+
+    def _substitute(self, value):
+        """Replaces placeholders of a registry entry with the parameters of this table"""
+        if self._substitutions and isinstance(value, sympy.Basic):
+            return value.xreplace(self._substitutions)
+        return value
+
+    def _next_half_moment(self, k: int, half: list):
+        """Computes e_k from e_0..e_{k-1} in half, with placeholders for symbolic shape parameters"""
+        b1, b2 = self.shape.get('beta1'), self.shape.get('beta2')
+        distribution = self.params.distribution
+
+        if distribution in ['uniform', 'uni']:
+            return sympy.Rational(1, 2) if k == 0 else half[k - 1] * sympy.Rational(k, k + 1)
+        elif distribution in ['lognormal', 'logn']:
+            return sympy.exp(((k ** 2) * (self.shape['scale'] ** 2)) / 2) / 2
+        elif distribution in ['trapezoidal', 'tra']:
+            return (1 - (b1 ** (k + 2))) / ((k ** 2 + (3 * k) + 2) * (1 - (b1 ** 2)))
+        elif distribution in ['triangular', 'tri']:
+            return sympy.Rational(1, 2) if k == 0 else half[k - 1] * sympy.Rational(k, k + 2)
+        elif distribution in ['beta', 'bet']:
+            return sympy.Rational(1, 2) if k == 0 else half[k - 1] * (b1 + k - 1) / (b1 + b2 + k - 1)
+        elif distribution in ['normal', 'nor']:
+            # odd moments are those of the half-normal distribution
+            if k < 2:
+                return sympy.Rational(1, 2) if k == 0 else 1 / (sympy.sqrt(2) * sympy.sqrt(sympy.pi))
+            return half[k - 2] * (k - 1)
+        elif distribution in ['student', 'stu']:
+            if k > 0 and not isinstance(b1, sympy.Basic) and b1 <= k:
+                # E[|Z|^k] diverges unless the degrees of freedom exceed k
+                raise ValueError(f'Moment of order {k} of the student distribution requires beta1 > {k}, got {b1:g}')
+            if k < 2:
+                return sympy.Rational(1, 2) if k == 0 else \
+                    sympy.sqrt(b1) * sympy.gamma((b1 - 1) / 2) / (2 * sympy.sqrt(sympy.pi) * sympy.gamma(b1 / 2))
+            return half[k - 2] * b1 * (k - 1) / (b1 - k)
+        elif distribution in ['laplace', 'lap']:
+            return sympy.Rational(1, 2) if k == 0 else half[k - 1] * k
+        elif distribution in ['gamma', 'gam']:
+            return sympy.Rational(1, 2) if k == 0 else half[k - 1] * (b1 + k - 1)
+        elif distribution in ['weibull', 'wei']:
+            return sympy.gamma((sympy.Integer(k) / b1) + 1) / 2
+        elif distribution in ['rayleigh', 'ray']:
+            if k < 2:
+                return sympy.Rational(1, 2) if k == 0 else sympy.sqrt(2) * sympy.sqrt(sympy.pi) / 4
+            return half[k - 2] * k
+        elif distribution in ['maxwell', 'max']:
+            if k < 2:
+                return sympy.Rational(1, 2) if k == 0 else sympy.sqrt(2) / sympy.sqrt(sympy.pi)
+            return half[k - 2] * (k + 1)
+        else:
+            raise ValueError('Unknown distribution type')
+
+    def _adjust_symmetry(self, half_moment, k: int):
+        """Adjusts e_k according to the symmetry type of the distribution"""
+        # TODO: Add support for asymmetrical distribution
+        if self.params.type == 'symmetrical':
+            return 2 * half_moment if k % 2 == 0 else 0
+        elif self.params.type == 'one_sided_right':
+            return 2 * half_moment
+        elif self.params.type == 'one_sided_left':
+            return ((-1) ** k) * 2 * half_moment
+        else:
+            raise ValueError('Unknown symmetry type')
@@ -0,0 +1,155 @@
+import math
+import numpy as np
+
+from typing import Dict, List, Union
+
+from polyvar import PolyVar
+
+
+# coefficients of the rational approximation of the standard normal quantile (P. J. Acklam), relative error 1.2e-9
+_PPF_A = [-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02, 1.383577518672690e+02,
+          -3.066479806614716e+01, 2.506628277459239e+00]
+_PPF_B = [-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02, 6.680131188771972e+01,
+          -1.328068155288572e+01]
+_PPF_C = [-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00, -2.549732539343734e+00,
+          4.374664141464968e+00, 2.938163982698783e+00]
+_PPF_D = [7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00]
+
+
+def norm_ppf(u: np.ndarray) -> np.ndarray:
+    """Quantile function of the standard normal distribution for u in (0, 1)"""
+    u = np.asarray(u, dtype=np.float64)
+    z = np.empty_like(u)
+
+    # central region
+    low, high = u < 0.02425, u > 1 - 0.02425
+    mid = ~(low | high)
+    q = u[mid] - 0.5
+    r = q * q
+    z[mid] = q * np.polyval(_PPF_A, r) / np.polyval(_PPF_B + [1.0], r)
+
+    # tails
+    q = np.sqrt(-2 * np.log(u[low]))
+    z[low] = np.polyval(_PPF_C, q) / np.polyval(_PPF_D + [1.0], q)
+    q = np.sqrt(-2 * np.log(1 - u[high]))
+    z[high] = -np.polyval(_PPF_C, q) / np.polyval(_PPF_D + [1.0], q)
+    return z
+
+
+def latin_hypercube(n: int, d: int, rng: np.random.Generator) -> np.ndarray:
+    """n points of a Latin hypercube sample in (0, 1)^d: every column hits each of n equal strata exactly once"""
+    strata = np.argsort(rng.random((d, n)), axis=1).T
+    u = (strata + rng.random((n, d))) / n
+    return np.clip(u, np.finfo(np.float64).tiny, 1 - np.finfo(np.float64).epsneg)
+
+
+def sample(params: PolyVar, u: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Draws V = translation + scale * Z from uniforms u, following the conventions of MomentTable
+
+    The one-sided standard variable W of the distribution is drawn by inverse transform where a closed form exists
+    and from rng otherwise. A symmetrical Z takes its sign and |Z| from the two halves of u, a one-sided left Z is -W.
+    """
+    if params.type == 'symmetrical':
+        sign, v = np.where(u < 0.5, -1.0, 1.0), np.abs(2 * u - 1)
+    elif params.type == 'one_sided_right':
+        sign, v = 1.0, u
+    elif params.type == 'one_sided_left':
+        sign, v = -1.0, u
+    else:
+        raise ValueError('Unknown symmetry type')
+
+    b1, b2 = params.beta1, params.beta2
+    distribution = params.distribution
+    if distribution in ['uniform', 'uni']:
+        w = v
+    elif distribution in ['trapezoidal', 'tra']:
+        # density 2 / (1 + b1) on [0, b1], decreasing linearly to 0 on [b1, 1]
+        c = 2 / (1 + b1)
+        w = np.where(v < c * b1, v / c, 1 - np.sqrt(2 * (1 - b1) * np.maximum(1 - v, 0) / c))
+    elif distribution in ['triangular', 'tri']:
+        w = 1 - np.sqrt(1 - v)
+    elif distribution in ['beta', 'bet']:
+        w = rng.beta(b1, b2, size=u.shape)
+    elif distribution in ['normal', 'nor']:
+        w = norm_ppf((1 + v) / 2)
+    elif distribution in ['student', 'stu']:
+        w = np.abs(rng.standard_t(b1, size=u.shape))
+    elif distribution in ['laplace', 'lap']:
+        w = -np.log1p(-v)
+    elif distribution in ['gamma', 'gam']:
+        w = rng.gamma(b1, size=u.shape)
+    elif distribution in ['weibull', 'wei']:
+        w = (-np.log1p(-v)) ** (1 / b1)
+    elif distribution in ['rayleigh', 'ray']:
+        w = np.sqrt(-2 * np.log1p(-v))
+    elif distribution in ['maxwell', 'max']:
+        w = np.sqrt(rng.chisquare(3, size=u.shape))
+    else:
+        raise ValueError(f'Sampling of distribution {distribution} is not supported')
+
+    return params.translation + params.scale * sign * w
+
+
+class SampledMoments:
+    """Moments E[(p - shift)^k], k = 0..K, of independent replicates of a quasi-Monte-Carlo sample of p
+
+    Replicates are independent Latin hypercube samples; their spread gives the standard error of every estimate.
+    """
+    def __init__(self, moments: np.ndarray, shift: float, samples: int):
+        self.moments = moments
+        self.shift = shift
+        self.samples = samples
+
+    def estimate(self, method: str = 'moment', order: Union[int, None] = None, confidence: float = 0.95) -> Dict:
+        """Estimate of a statistic with its standard error and a normal confidence interval"""
+        value = self._statistic(self.moments.mean(axis=0), method, order)
+        replicates = np.array([self._statistic(m, method, order) for m in self.moments])
+        stderr = float(np.std(replicates, ddof=1) / math.sqrt(len(replicates)))
+        z = float(norm_ppf(np.array([(1 + confidence) / 2]))[0])
+        return {'value': value, 'stderr': stderr, 'low': value - z * stderr, 'high': value + z * stderr,
+                'samples': self.samples}
+
+    def _statistic(self, m: np.ndarray, method: str, order: Union[int, None]) -> float:
+        """Statistic from shifted moments m[k] = E[(p - shift)^k]"""
+        if method == 'moment':
+            if order is None or order >= len(m):
+                raise ValueError(f'Moment order {order} was not sampled')
+            return float(sum(math.comb(order, k) * self.shift ** (order - k) * m[k] for k in range(order + 1)))
+        if method == 'mean':
+            return float(self.shift + m[1])
+
+        # central moments from the shifted ones
+        c = {k: sum(math.comb(k, j) * m[j] * (-m[1]) ** (k - j) for j in range(k + 1)) for k in range(2, len(m))}
+        if method == 'var':
+            return float(c[2])
+        elif method == 'std':
+            return math.sqrt(c[2])
+        elif method == 'skew':
+            return float(c[3] / c[2] ** 1.5)
+        elif method == 'kurt':
+            return float(c[4] / c[2] ** 2)
+        raise ValueError(f'Statistic {method} is not supported')
+
+
+def sample_moments(func, dist: List[PolyVar], max_order: int, samples: int = 65536, chunk_size: int = 4096,
+                   seed: Union[int, None] = None) -> SampledMoments:
+    """Samples moments of func(*variables) up to max_order, one chunk of at most chunk_size points per replicate"""
+    rng = np.random.default_rng(seed)
+    replicates = max(2, math.ceil(samples / chunk_size))
+    size = max(2, samples // replicates)
+
+    moments = np.empty((replicates, max_order + 1), dtype=np.float64)
+    shift = None
+    for r in range(replicates):
+        u = latin_hypercube(size, len(dist), rng)
+        values = np.broadcast_to(func(*[sample(v, u[:, j], rng) for j, v in enumerate(dist)]), (size,))
+
+        # powers are taken about the mean of the first chunk to limit cancellation in central moments
+        if shift is None:
+            shift = float(values.mean())
+        centred = values - shift
+        power = np.ones(size, dtype=np.float64)
+        for k in range(max_order + 1):
+            moments[r, k] = power.mean()
+            power *= centred
+    return SampledMoments(moments=moments, shift=shift, samples=replicates * size)
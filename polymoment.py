@@ -1,91 +1,377 @@
+import contextlib
+import math
+import numpy as np
 import sympy
 
-from functools import lru_cache
-from typing import Dict
+from typing import Dict, List
+from instrumentation import Metrics
+from momenttable import MomentTable
+from montecarlo import SampledMoments, sample_moments
+from polyparser import parse_poly
 from polyvar import PolyVar
+from sharding import PARALLEL, ShardedExpectation
+from sparsepoly import SparsePoly
+
+
+__version__ = '1.0.0'
+
+BACKENDS = ['auto', 'symbolic', 'numeric']
+ENGINES = ['exact', 'approximate']
+SIMPLIFY = ['none', 'cheap', 'full']
+STATISTICS = ['moment', 'mean', 'std', 'var', 'skew', 'kurt']
+
+# highest moment order every statistic other than moment depends on
+STATISTIC_ORDERS = {'mean': 1, 'std': 2, 'var': 2, 'skew': 3, 'kurt': 4}
+
+# relative cost of a monomial with symbolic coefficients, per term of the parameter polynomial it carries
+SYMBOLIC_COST = 20
+# upper cost bound of each time class; a unit of cost is roughly 0.1 ms of computation
+TIME_CLASSES = [('fast', 1e4), ('slow', 1e6), ('very_slow', math.inf)]
+
+# monomials from which a power is evaluated in parallel shards when PolyMoment has workers
+SHARD_MIN_MONOMIALS = 50000
+
+
+def _factorial2(n):
+    """Double factorial of a non-negative integer, with (-1)!! = 1"""
+    return float(math.prod(range(int(n), 0, -2)))
+
+
+# vectorized replacements for functions that appear in compute_eval output but have no numpy counterpart
+NUMPY_FUNCTIONS = {
+    'gamma': np.vectorize(math.gamma, otypes=[np.float64]),
+    'loggamma': np.vectorize(math.lgamma, otypes=[np.float64]),
+    'factorial': np.vectorize(lambda n: math.gamma(n + 1), otypes=[np.float64]),
+    'factorial2': np.vectorize(_factorial2, otypes=[np.float64]),
+}
 
 
 class PolyMoment:
-    def __init__(self, poly: str, dist: Dict):
-        for key in dist.keys():
-            self.__dict__[key] = sympy.symbols(key)
-        self.poly = sympy.poly(eval(poly.replace('x', 'self.x')))
-        self.dist = {k: PolyVar(**v) for k, v in dist.items()}
+    def __init__(self, poly: str, dist: Dict, backend: str = 'auto', simplify: str = 'full',
+                 metrics: Metrics = None, chunk_size: int = None, workers: int = None, parallel: str = 'process'):
+        # optional recorder of phase timings and counters; None keeps instrumentation off
+        self.metrics = metrics
+
+        with self._phase('parse'):
+            self.dist = {k: PolyVar(**v) for k, v in dist.items()}
+            self.poly = self.parse(poly)
+
+        # per-variable tables of E[V^k]
+        self.tables = {k: MomentTable(v) for k, v in self.dist.items()}
+
+        # numeric backend is picked automatically when every distribution parameter is a number
+        if backend not in BACKENDS:
+            raise ValueError(f'Backend {backend} is not supported')
+        numeric = all(v.is_numeric() for v in self.dist.values())
+        if backend == 'numeric' and not numeric:
+            raise ValueError('Numeric backend requires numeric translation, scale, beta1 and beta2 for all variables')
+        self.backend = ('numeric' if numeric else 'symbolic') if backend == 'auto' else backend
+
+        # simplification applied once to every final statistic
+        if simplify not in SIMPLIFY:
+            raise ValueError(f'Simplification policy {simplify} is not supported')
+        self.simplify = simplify
+
+        # with a chunk size, powers of self.poly are never expanded in full but streamed in chunks of monomials
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError('Chunk size must be a positive integer')
+        self.chunk_size = chunk_size
+
+        # with several workers, large powers are split into shards evaluated in a process pool or on Ray
+        if workers is not None and workers < 1:
+            raise ValueError('Number of workers must be a positive integer')
+        if parallel not in PARALLEL:
+            raise ValueError(f'Parallel backend {parallel} is not supported')
+        self.workers = workers
+        self.parallel = parallel
+
+        # compiled statistics keyed on (method, order)
+        self._compiled = {}
 
     def __call__(self, *args, **kwargs):
         return self.moment(*args, **kwargs)
 
+    def parse(self, poly: str) -> sympy.Poly:
+        """Parses poly in the variables of self.dist; see polyparser.parse_poly"""
+        return parse_poly(poly, variables=list(self.dist))
+
     def std(self):
         """Calculates standard deviation of self.poly"""
-        std = sympy.sqrt(self.var())
-        return sympy.simplify(std)
+        return self._simplify(self._sqrt(self.var()))
 
     def var(self):
         """Calculates variance of self.poly"""
-        var = self.moment(order=2) - (self.moment(order=1) ** 2)
-        return sympy.simplify(var)
+        return self._simplify(self._central_moments(orders=[2])[2])
 
     def skew(self):
         """Calculates skewness of self.poly"""
-        mean = self.mean()
-        var = self.var()
-        skew = (self.moment(order=3) - (3 * mean * var) - (mean ** 3)) / (sympy.sqrt(var) ** 3)
-        return sympy.simplify(skew)
+        c = self._central_moments(orders=[2, 3])
+        return self._simplify(self._skew(c, var=self._simplify(c[2])))
 
     def kurt(self):
         """Calculates kurtosis (excess kurtosis + 3) of self.poly"""
-        e1, e2, e3, e4 = self.moment(order=1), self.moment(order=2), self.moment(order=3), self.moment(order=4)
-        c_mom4 = -3 * e1 ** 4 + 6 * e1 ** 2 * e2 - 4 * e1 * e3 + e4
-        kurt = c_mom4 / ((e2 - (e1 ** 2)) ** 2)
-        return sympy.simplify(kurt)
+        return self._simplify(self._kurt(self._central_moments(orders=[2, 4])))
 
     def mean(self):
         """Calculates mean of self.poly"""
-        mu = self.moment(order=1)
-        return sympy.simplify(mu)
+        return self._simplify(self._moments(orders=[1])[1])
+
+    def stats(self) -> Dict:
+        """Calculates mean, var, std, skew and kurt of self.poly from a single pass over moments of order 1 to 4"""
+        mean = self.mean()
+        c = self._central_moments(orders=range(2, 5), mean=mean)
+        var = self._simplify(c[2])
+        return {
+            'mean': mean,
+            'var': var,
+            'std': self._simplify(self._sqrt(var)),
+            'skew': self._simplify(self._skew(c, var=var)),
+            'kurt': self._simplify(self._kurt(c)),
+        }
 
     def moment(self, order: int):
         """Calculates the expectation of self.poly raised to the power of order"""
-        # expand polynomial for moment order
-        p = self.poly ** order
+        return self.moments(orders=[order])[order]
+
+    def moments(self, orders=range(1, 5)) -> Dict:
+        """Calculates the expectations of self.poly raised to each power in orders, building p^k as p^(k-1)*p"""
+        return {order: self._simplify(moment) for order, moment in self._moments(orders=orders).items()}
+
+    def iter_moments(self, orders=range(1, 5)):
+        """Yields (order, moment) for each power in orders as soon as it is computed, in increasing order"""
+        for order, moment in self._iter_moments(orders=orders):
+            yield order, self._simplify(moment)
+
+    def central_moment(self, order: int):
+        """Calculates the expectation of (self.poly - E[self.poly]) raised to the power of order"""
+        return self._simplify(self._central_moments(orders=[order])[order])
+
+    def estimate_cost(self, order: int, central: bool = False) -> Dict:
+        """Predicts the work of the moments of self.poly up to order without expanding any power
+
+        An independent part with n terms in v variables of degree at most d has at most min(C(k + n - 1, k),
+        C(v + kd, v)) monomials in its k-th power, and every power up to order is expanded. With central, the part
+        also carries the mean shift and its variables are centred. Symbolic coefficients are polynomials in the
+        distribution parameters, so each monomial costs SYMBOLIC_COST times the terms of such a polynomial of
+        degree order.
+        """
+        if order < 0:
+            raise ValueError('Moment order must be a non-negative integer')
+
+        centered = central and self._centerable()
+        gens = self.poly.gens
+        parts = SparsePoly.from_poly(self.poly).components(labels=[list(g.free_symbols)[0].name for g in gens])
+        monomials = 0
+        for _, part in parts:
+            n, (v, d) = len(part), (part.exps.shape[1], int(part.exps.sum(axis=1).max(initial=0)))
+            if centered:
+                # substituting translation + V for every V turns x^a y^b into up to (a + 1)(b + 1) monomials
+                n = min(int(np.prod(part.exps + 1, axis=1).sum()), math.comb(v + d, v))
+            n += central
+            monomials += sum(min(math.comb(k + n - 1, k), math.comb(v + k * d, v)) for k in range(1, order + 1))
+
+        # translations cancel out of centred moments
+        names = {list(g.free_symbols)[0].name for g in gens}
+        params = set()
+        for name in names & set(self.dist):
+            v = self.dist[name]
+            for p in ((v.scale, v.beta1, v.beta2) if centered else (v.translation, v.scale, v.beta1, v.beta2)):
+                if isinstance(p, sympy.Basic):
+                    params |= p.free_symbols
+        terms = math.comb(len(params) + order, order)
+
+        cost = monomials * (SYMBOLIC_COST * terms if self.backend == 'symbolic' else 1)
+        return {'order': order, 'central': central, 'monomials': monomials, 'parameter_terms': terms,
+                'backend': self.backend, 'cost': cost, 'time_class': time_class(cost)}
+
+    def _central_moments(self, orders, mean=None) -> Dict:
+        """Unsimplified central moments, expanding self.poly shifted by its mean"""
+        mean = self.mean() if mean is None else mean
+        return self._moments(orders=orders, shift=mean, centered=self._centerable())
+
+    def _centerable(self) -> bool:
+        """Checks whether self.poly can be rewritten in the centred variables V - translation"""
+        return all(isinstance(gen, sympy.Symbol) for gen in self.poly.gens)
+
+    def _moments(self, orders, shift=0, centered: bool = False) -> Dict:
+        """Unsimplified expectations of (self.poly - shift) raised to each power in orders"""
+        return dict(self._iter_moments(orders=orders, shift=shift, centered=centered))
+
+    def _iter_moments(self, orders, shift=0, centered: bool = False):
+        """Yields unsimplified expectations of (self.poly - shift) raised to each power in orders
+
+        With centered, every variable V is substituted by its translation plus a centred variable, so that only
+        E[(V - translation)^k] enters the expectation. With self.chunk_size, the monomials of every power are
+        generated and reduced chunk by chunk instead of keeping the expanded power. With self.workers, powers of at
+        least SHARD_MIN_MONOMIALS monomials are streamed the same way in parallel shards.
+        """
+        orders = sorted(set(int(order) for order in orders))
+        if orders and orders[0] < 0:
+            raise ValueError('Moment order must be a non-negative integer')
+
+        gens = self.poly.gens
+        base = self.poly
+        if centered:
+            base = sympy.Poly(base.as_expr().xreplace({g: g + self.dist[g.name].translation for g in gens}), *gens)
+        if shift != 0:
+            base = base - shift
+
+        # split into additive parts over independent variables; only coupled variables are expanded jointly
+        base = SparsePoly.from_poly(base, numeric=self.backend == 'numeric')
+        max_orders = base.exps.max(axis=0, initial=0) * (orders[-1] if orders else 0)
+        with self._phase('expectation'):
+            tables = self._tables(gens=gens, max_orders=max_orders, centered=centered)
+        parts = base.components(labels=[list(g.free_symbols)[0].name for g in gens])
+        powers = [part.one() for _, part in parts]
+        part_moments = [[] for _ in parts]
+        combined = [[] for _ in parts]
+        sharded = contextlib.nullcontext()
+        if self.workers is not None and self.workers > 1:
+            sharded = ShardedExpectation([(part, [tables[j] for j in columns]) for columns, part in parts],
+                                         workers=self.workers, parallel=self.parallel,
+                                         chunk_size=self.chunk_size or 4096)
+
+        # expand every part once per order; moments of a sum of independent parts combine by binomial convolution,
+        # E[(A + B)^n] = sum_k C(n, k) E[A^k] E[B^(n-k)], the moment form of cumulants adding; E[p^0] = 1
+        with sharded as shards:
+            for order in range(orders[-1] + 1 if orders else 0):
+                for i, (columns, part) in enumerate(parts):
+                    monomials = math.comb(order + len(part) - 1, order)
+                    if shards is not None and monomials >= SHARD_MIN_MONOMIALS:
+                        # the number of monomials grows with order, so later orders of the part are sharded too
+                        with self._phase('expectation'):
+                            part_moments[i].append(shards.power_expectation(i, order))
+                        self._count('monomials', monomials)
+                    elif self.chunk_size is not None:
+                        with self._phase('expectation'):
+                            part_moments[i].append(part.power_expectation(order, [tables[j] for j in columns],
+                                                                          chunk_size=self.chunk_size))
+                        self._count('monomials', monomials)
+                    else:
+                        if order > 0:
+                            with self._phase('expand'):
+                                powers[i] = powers[i] * part
+                        with self._phase('expectation'):
+                            part_moments[i].append(powers[i].expectation([tables[j] for j in columns]))
+                        self._count('monomials', len(powers[i]))
+                    if i == 0:
+                        combined[i].append(part_moments[i][order])
+                    else:
+                        combined[i].append(sum(math.comb(order, k) * combined[i - 1][k] * part_moments[i][order - k]
+                                               for k in range(order + 1)))
+                if order in orders:
+                    yield order, combined[-1][order]
 
-        # coefficients and monomials
+    def expectation(self, p: sympy.Poly, centered: bool = False):
+        """Calculates the expectation of polynomial p in the random variables (or centred variables) of self.dist"""
         gens = p.gens
-        coeffs = p.coeffs()
-        monoms = p.monoms()
+        p = SparsePoly.from_poly(p, numeric=self.backend == 'numeric')
+        return p.expectation(self._tables(gens=gens, max_orders=p.exps.max(axis=0, initial=0), centered=centered))
 
-        eval_monoms = []
-        for monom in monoms:
-            eval_monom_temp = []
-            for m_index, m in enumerate(monom):
-                # continue if m is 0; The convention E[V^0] = 1 is adopted here
-                if m == 0:
-                    eval_monom_temp.append(1)
-                    continue
+    def _tables(self, gens, max_orders, centered: bool = False):
+        """Per-generator lists of E[g^m] (or centred moments) for m = 0..max_orders[j]; E[g^0] = 1"""
+        if self.metrics is not None:
+            # entries already in a moment table are hits; the rest are computed by recurrence or closed form
+            for gen, max_order in zip(gens, max_orders):
+                known = len(self.tables[gen.name]) - 1 if isinstance(gen, sympy.Symbol) else 0
+                self._count('table_hits', min(int(max_order), max(known, 0)))
+                self._count('table_misses', max(int(max_order) - max(known, 0), 0))
 
-                # E value of random variable in monomial
-                eval_monom_temp.append(self.compute_eval(v=gens[m_index], m=m))
+        return [[1] + [self._eval(v=gen, m=m, centered=centered) for m in range(1, int(max_order) + 1)]
+                for gen, max_order in zip(gens, max_orders)]
 
-            # product of all element in list
-            eval_monom = 1
-            for ev in eval_monom_temp:
-                eval_monom = eval_monom * ev
+    def params(self):
+        """Returns the parameter symbols of the distributions in self.dist, in order of appearance"""
+        params = []
+        for v_params in self.dist.values():
+            for p in (v_params.translation, v_params.scale, v_params.beta1, v_params.beta2):
+                if isinstance(p, sympy.Basic):
+                    params.extend(s for s in sorted(p.free_symbols, key=str) if s not in params)
+        return params
 
-            eval_monoms.append(eval_monom)
+    def compile(self, method: str = 'var', order: int = None) -> 'CompiledStatistic':
+        """Compiles a statistic of self.poly into a vectorized NumPy callable of the distribution parameters"""
+        if method not in STATISTICS:
+            raise ValueError(f'Statistic {method} is not supported')
+        if method == 'moment' and order is None:
+            raise ValueError('Moment order is required to compile a moment')
 
-        # element-wise multiplication
-        moment = 0
-        for co, ev in zip(coeffs, eval_monoms):
-            moment = moment + co * ev
+        key = (method, order if method == 'moment' else None)
+        if key not in self._compiled:
+            expr = self.moment(order=order) if method == 'moment' else getattr(self, method)()
+            self._compiled[key] = CompiledStatistic(expr=expr, params=self.params())
+        return self._compiled[key]
 
-        return sympy.simplify(moment)
+    def approximate(self, method: str = 'moment', order: int = None, samples: int = 65536, chunk_size: int = 4096,
+                    confidence: float = 0.95, seed: int = None) -> Dict:
+        """Estimates a statistic of self.poly by quasi-Monte-Carlo sampling, with a confidence interval
+
+        Returns a dict of value, stderr, low, high and samples. Requires numeric distribution parameters.
+        """
+        if method not in STATISTICS:
+            raise ValueError(f'Statistic {method} is not supported')
+        max_order = order if method == 'moment' else STATISTIC_ORDERS[method]
+        sampled = self.sample_moments(max_order=max_order, samples=samples, chunk_size=chunk_size, seed=seed)
+        return sampled.estimate(method=method, order=order, confidence=confidence)
+
+    def sample_moments(self, max_order: int, samples: int = 65536, chunk_size: int = 4096,
+                       seed: int = None) -> SampledMoments:
+        """Samples the moments of self.poly up to max_order in chunks of at most chunk_size points"""
+        if max_order is None or max_order < 0:
+            raise ValueError('Moment order must be a non-negative integer')
+        if not all(v.is_numeric() for v in self.dist.values()):
+            raise ValueError(
+                'Approximate engine requires numeric translation, scale, beta1 and beta2 for all variables'
+            )
+        with self._phase('sample'):
+            func = sympy.lambdify([sympy.Symbol(k) for k in self.dist], self.poly.as_expr(), modules='numpy')
+            return sample_moments(func=func, dist=list(self.dist.values()), max_order=int(max_order),
+                                  samples=samples, chunk_size=chunk_size, seed=seed)
+
+    def _skew(self, c: Dict, var):
+        """Skewness from central moments c and the simplified variance"""
+        return c[3] / (self._sqrt(var) ** 3)
+
+    def _kurt(self, c: Dict):
+        """Kurtosis (excess kurtosis + 3) from central moments c"""
+        return c[4] / (c[2] ** 2)
+
+    def _simplify(self, expr):
+        """Simplifies a final statistic according to self.simplify, or converts it to a float for numeric backend"""
+        with self._phase('simplify'):
+            if self.backend == 'numeric':
+                return float(expr)
+            if self.simplify == 'full':
+                return sympy.simplify(expr)
+            if self.simplify == 'cheap':
+                return sympy.cancel(sympy.together(sympy.expand(expr)))
+            return expr
+
+    def _phase(self, name: str):
+        """Context timing phase name when instrumentation is on"""
+        return contextlib.nullcontext() if self.metrics is None else self.metrics.phase(name)
+
+    def _count(self, name: str, n: int = 1):
+        """Adds n to counter name when instrumentation is on"""
+        if self.metrics is not None:
+            self.metrics.count(name, n)
+
+    def _sqrt(self, expr):
+        """Square root matching the active backend"""
+        if self.backend == 'numeric':
+            return math.sqrt(expr)
+        return sympy.sqrt(expr)
+
+    def _eval(self, v, m, centered: bool = False):
+        """E[V^m], or E[(V - translation)^m] when centered"""
+        if centered:
+            return self.tables[v.name].centered(int(m))
+        return self.compute_eval(v=v, m=m)
 
-    @lru_cache
     def compute_eval(self, v, m):
         """Calculate E[V^m] based on tables 3.1 and 3.2 in thesis"""
-        # get symbol and parameter of V
+        # get parameter of V
         v_params = self.dist[list(v.free_symbols)[0].name]
-        v_symbol = self.__dict__[list(v.free_symbols)[0].name]
 
         if not isinstance(v, sympy.Pow):
             # check the feasibility of analytic expansion
@@ -95,82 +381,8 @@ class PolyMoment:
                     f'this type of distribution '
                 )
 
-            # binomial expansion making v a random variable with standard distribution
-            v_temp = sympy.poly(v_params.translation + v_symbol, v_symbol) ** m
-
-            # get coefficients and monomials
-            v_coeffs = v_temp.coeffs()
-            v_monoms = v_temp.all_monoms()
-
-            evms = []
-            for v_monom in v_monoms:
-                v_monom = v_monom[0]
-                if v_params.distribution in ['uniform', 'uni']:
-                    evm_temp = (v_params.scale ** v_monom) / ((v_monom + 1) * 2)
-                elif v_params.distribution in ['lognormal', 'logn']:
-                    evm_temp = sympy.exp(((v_monom ** 2) * (v_params.scale ** 2)) / 2)
-                elif v_params.distribution in ['trapezoidal', 'tra']:
-                    evm_temp = (v_params.scale ** v_monom) / (v_monom ** 2 + (3 * v_monom) + 2) * \
-                               ((1 - (v_params.beta1 ** (v_monom + 2))) / (1 - (v_params.beta1 ** 2)))
-                elif v_params.distribution in ['triangular', 'tri']:
-                    evm_temp = (v_params.scale ** v_monom) / (v_monom ** 2 + (3 * v_monom) + 2)
-                elif v_params.distribution in ['beta', 'bet']:
-                    evm_temp = (v_params.scale ** v_monom) / 2
-                    for ptm in range(v_monom):
-                        evm_temp = evm_temp * (v_params.beta1 + (ptm + 1) - 1) / \
-                                   (v_params.beta1 + v_params.beta2 + (ptm + 1) - 1)
-                elif v_params.distribution in ['normal', 'nor']:
-                    if v_monom % 2 == 0:
-                        # when v_monom is even
-                        evm_temp = (v_params.scale ** v_monom) * sympy.factorial2(v_monom - 1) / 2
-                    else:
-                        # when v_monom is odd
-                        evm_temp = (v_params.scale ** v_monom) * (2 ** ((v_monom / 2) - 1) * sympy.factorial((v_monom - 1) / 2)) \
-                                   / sympy.sqrt(sympy.pi)
-                elif v_params.distribution in ['student', 'stu']:
-                    evm_temp = (v_params.scale ** v_monom) * \
-                               (v_params.beta1 ** (v_monom / 2) * sympy.gamma((v_monom + 1) / 2) * sympy.gamma((v_params.beta1 - v_monom) / 2)) / \
-                               (2 * sympy.sqrt(sympy.pi) * sympy.gamma(v_params.beta1 / 2))
-                elif v_params.distribution in ['laplace', 'lap']:
-                    evm_temp = (v_params.scale ** v_monom) * sympy.factorial(v_monom) / 2
-                elif v_params.distribution in ['gamma', 'gam']:
-                    evm_temp = (v_params.scale ** v_monom) / 2
-                    for ptm in range(v_monom):
-                        evm_temp = evm_temp * (v_params.beta1 + (ptm + 1) - 1)
-                elif v_params.distribution in ['weibull', 'wei']:
-                    evm_temp = (v_params.scale ** v_monom) * (sympy.gamma((v_monom / v_params.beta1) + 1)) / 2
-                elif v_params.distribution in ['rayleigh', 'ray']:
-                    evm_temp = (v_params.scale ** v_monom) * (2 ** ((v_monom / 2) - 1)) * sympy.gamma((2 + v_monom) / 2)
-                elif v_params.distribution in ['maxwell', 'max']:
-                    if v_monom % 2 == 0:
-                        # when v_monom is even
-                        evm_temp = (v_params.scale ** v_monom) * sympy.factorial2(v_monom + 1)
-                    else:
-                        # when v_monom is odd
-                        evm_temp = (v_params.scale ** v_monom) * (2 ** ((v_monom / 2) + 1) / sympy.sqrt(sympy.pi)) * \
-                                   sympy.factorial((v_monom + 1) / 2)
-                else:
-                    raise ValueError('Unknown distribution type')
-
-                # adjust moment according to symmetry
-                # TODO: Add support for asymmetrical distribution
-                if v_params.type == 'symmetrical':
-                    evm_temp = 2 * evm_temp if v_monom % 2 == 0 else 0
-                elif v_params.type == 'one_sided_right':
-                    evm_temp = 2 * evm_temp
-                elif v_params.type == 'one_sided_left':
-                    evm_temp = ((-1) ** evm_temp) * 2 * evm_temp
-                else:
-                    raise ValueError('Unknown symmetry type')
-
-                evms.append(evm_temp)
-
-            # element-wise multiplication
-            res = 0
-            for evm, v_coeff in zip(evms, v_coeffs):
-                res = res + evm * v_coeff
-
-            return res
+            # look up E[V^m] in the moment table of V, growing it by recurrence when needed
+            return self.tables[list(v.free_symbols)[0].name][int(m)]
         else:
             m, mu, scale = m * v.exp, v_params.translation, v_params.scale
             if v_params.distribution in ['uniform', 'uni']:
@@ -182,3 +394,128 @@ class PolyMoment:
                 return sympy.exp((mu * m) + (m ** 2 * scale ** 2 / 2))
             else:
                 raise ValueError('Unknown distribution type')
+
+
+def time_class(cost: float) -> str:
+    """Name of the first time class whose bound is at least cost"""
+    return next(name for name, bound in TIME_CLASSES if cost <= bound)
+
+
+class CompiledStatistic:
+    """Symbolic statistic compiled into a vectorized NumPy callable"""
+    def __init__(self, expr, params):
+        self.expr = sympy.sympify(expr)
+        self.params = list(params)
+        self.func = sympy.lambdify(self.params, self.expr, modules=[NUMPY_FUNCTIONS, 'numpy'])
+
+    def __call__(self, *args, **kwargs):
+        """Evaluates the statistic over broadcastable arrays given positionally, by name or as a single dict"""
+        if len(args) == 1 and isinstance(args[0], dict):
+            kwargs = {**{str(k): v for k, v in args[0].items()}, **kwargs}
+            args = ()
+        if len(args) > len(self.params):
+            raise ValueError(f'Expected at most {len(self.params)} parameter arrays, got {len(args)}')
+
+        values = list(args)
+        for param in self.params[len(args):]:
+            if param.name not in kwargs:
+                raise ValueError(f'Missing values for parameter {param.name}')
+            values.append(kwargs.pop(param.name))
+        if kwargs:
+            raise ValueError(f'Unknown parameters {sorted(kwargs)}')
+
+        arrays = np.broadcast_arrays(*[np.asarray(v, dtype=np.float64) for v in values])
+        shape = arrays[0].shape if arrays else ()
+        return np.broadcast_to(np.asarray(self.func(*arrays), dtype=np.float64), shape).copy()
+
+
+class PolyMomentVector:
+    """Joint moments of several polynomials in the random variables of one dist
+
+    Parsing, moment tables and the powers of every polynomial are shared between outputs, so the mean vector, the
+    covariance matrix and mixed moments E[p_i^a p_j^b] come from one set of expansions.
+    """
+    def __init__(self, polys: List[str], dist: Dict, backend: str = 'auto', simplify: str = 'full',
+                 metrics: Metrics = None):
+        if not polys:
+            raise ValueError('At least one polynomial is required')
+
+        # the first output carries the variables, moment tables, backend and simplification policy of all outputs
+        self.base = PolyMoment(poly=polys[0], dist=dist, backend=backend, simplify=simplify, metrics=metrics)
+        with self.base._phase('parse'):
+            exprs = [self.base.poly.as_expr()] + [self.base.parse(poly).as_expr() for poly in polys[1:]]
+            self.polys = list(sympy.parallel_poly_from_expr(exprs)[0])
+        self.gens = self.polys[0].gens
+        self.backend = self.base.backend
+
+        # SparsePoly powers keyed on (output, power, centered)
+        self._powers = {}
+        self._means = None
+
+    def __len__(self):
+        return len(self.polys)
+
+    def mean(self) -> List:
+        """Mean of every polynomial"""
+        return [self.base._simplify(mean) for mean in self._mean()]
+
+    def cov(self) -> List[List]:
+        """Covariance matrix E[(p_i - E[p_i]) (p_j - E[p_j])], expanded in the centred variables when possible"""
+        centered = all(isinstance(g, sympy.Symbol) for g in self.gens)
+        # powers such as sqrt(x0) cannot be centred, so their covariance is E[p_i p_j] - E[p_i] E[p_j]
+        means = None if centered else self._mean()
+        matrix = [[None] * len(self) for _ in self.polys]
+        for i in range(len(self)):
+            for j in range(i, len(self)):
+                value = self._expectation(i, 1, j, 1, centered=centered)
+                if not centered:
+                    value = value - means[i] * means[j]
+                matrix[i][j] = matrix[j][i] = self.base._simplify(value)
+        return matrix
+
+    def mixed_moment(self, i: int, j: int, a: int, b: int):
+        """E[p_i^a p_j^b]"""
+        for index in (i, j):
+            if not 0 <= index < len(self):
+                raise ValueError(f'Output {index} does not exist')
+        if a < 0 or b < 0:
+            raise ValueError('Moment order must be a non-negative integer')
+        return self.base._simplify(self._expectation(i, a, j, b))
+
+    def _mean(self) -> List:
+        """Simplified means, computed once and used as the shifts of central moments"""
+        if self._means is None:
+            self._means = [self.base._simplify(self._expectation(i, 1, i, 0)) for i in range(len(self))]
+        return self._means
+
+    def _expectation(self, i: int, a: int, j: int, b: int, centered: bool = False):
+        """Unsimplified E[q_i^a q_j^b], q being the outputs, or the outputs less their means in centred variables"""
+        with self.base._phase('expand'):
+            product = self._power(i, a, centered) * self._power(j, b, centered)
+        self.base._count('monomials', len(product))
+        with self.base._phase('expectation'):
+            tables = self.base._tables(gens=self.gens, max_orders=product.exps.max(axis=0, initial=0),
+                                       centered=centered)
+            return product.expectation(tables)
+
+    def _power(self, i: int, k: int, centered: bool) -> SparsePoly:
+        """Expanded power k of output i, built from the cached power k - 1"""
+        key = (i, k, centered)
+        if key not in self._powers:
+            if k == 1:
+                for index, base in enumerate(self._bases(centered)):
+                    self._powers[(index, 1, centered)] = base
+            elif k == 0:
+                self._powers[key] = self._power(i, 1, centered).one()
+            else:
+                self._powers[key] = self._power(i, k - 1, centered) * self._power(i, 1, centered)
+        return self._powers[key]
+
+    def _bases(self, centered: bool) -> List[SparsePoly]:
+        """Outputs as SparsePoly, or the outputs less their means in centred variables, over one coefficient domain"""
+        polys = self.polys
+        if centered:
+            shifts = {g: g + self.base.dist[g.name].translation for g in self.gens}
+            exprs = [poly.as_expr().xreplace(shifts) - mean for poly, mean in zip(polys, self._mean())]
+            polys = sympy.parallel_poly_from_expr(exprs, *self.gens)[0]
+        return [SparsePoly.from_poly(poly, numeric=self.backend == 'numeric') for poly in polys]
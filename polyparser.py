@@ -0,0 +1,94 @@
+import functools
+import io
+import re
+import sympy
+import tokenize
+
+from sympy.parsing.sympy_parser import convert_xor, parse_expr, standard_transformations
+from sympy.polys.polyerrors import BasePolynomialError
+from typing import Sequence, Tuple
+
+
+class InvalidPolynomial(ValueError):
+    """Raised when a polynomial string is malformed or uses anything but numbers, its variables and FUNCTIONS"""
+
+
+# names a polynomial may use besides its variables; square roots give the powers V^(1/2) of uniform variables
+FUNCTIONS = {'sqrt': sympy.sqrt}
+CONSTANTS = {'pi': sympy.pi, 'E': sympy.E}
+OPERATORS = {'+', '-', '*', '/', '**', '^', '(', ')'}
+
+# decimal literals only; no complex, hexadecimal or underscored numbers
+NUMBER = re.compile(r'(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?')
+
+# largest absolute exponent, so that a short string cannot stand for an arbitrarily large number or polynomial
+MAX_EXPONENT = 64
+
+# namespace the parsed code is evaluated in: the constructors sympy's parser emits and the names above
+NAMESPACE = {
+    '__builtins__': {}, 'Integer': sympy.Integer, 'Float': sympy.Float, 'Rational': sympy.Rational,
+    'Symbol': sympy.Symbol, 'Add': sympy.Add, 'Mul': sympy.Mul, 'Pow': sympy.Pow, **FUNCTIONS, **CONSTANTS,
+}
+
+
+def parse_poly(poly: str, variables: Sequence[str]) -> sympy.Poly:
+    """Parses poly as a polynomial in the given variable names, with ^ as an alternative to **
+
+    Input is checked token by token before sympy parses it: only numbers, the variables, the names of FUNCTIONS and
+    CONSTANTS, arithmetic operators and parentheses are accepted, so no attribute access, call or string ever
+    reaches the evaluation. Results are cached on (poly, variables).
+    """
+    return _parse(poly.strip(), tuple(variables))
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse(poly: str, variables: Tuple[str, ...]) -> sympy.Poly:
+    if not poly:
+        raise InvalidPolynomial('Polynomial is empty')
+    names = {name: sympy.Symbol(name) for name in variables}
+    _check_tokens(poly, names)
+
+    transformations = standard_transformations + (convert_xor,)
+    try:
+        # unevaluated first, so exponents are checked before any power is computed
+        expr = parse_expr(poly, local_dict=names, global_dict=dict(NAMESPACE), transformations=transformations,
+                          evaluate=False)
+        for node in sympy.preorder_traversal(expr):
+            if node.is_Pow and (node.exp.free_symbols or not abs(node.exp.evalf()) <= MAX_EXPONENT):
+                raise InvalidPolynomial(f'Exponent {node.exp} is not a number of at most {MAX_EXPONENT} in size')
+        expr = parse_expr(poly, local_dict=names, global_dict=dict(NAMESPACE), transformations=transformations)
+        if expr.has(sympy.zoo, sympy.nan, sympy.oo):
+            raise InvalidPolynomial('Coefficients must be finite')
+        if not expr.free_symbols:
+            raise InvalidPolynomial('Polynomial must contain at least one variable')
+        # constants such as pi belong to the coefficients; generators are variables or powers of one
+        gens = [gen for gen in sympy.poly(expr).gens if gen.free_symbols]
+        for gen in gens:
+            if not (gen.is_Symbol or gen.is_Pow and gen.base.is_Symbol):
+                raise InvalidPolynomial(f'{gen} is not a variable or a power of one')
+        return sympy.poly(expr, *gens)
+    except SyntaxError as e:
+        # positions refer to the code generated by sympy's transformations, not to poly
+        raise InvalidPolynomial(e.msg)
+    except (TypeError, ZeroDivisionError, tokenize.TokenError, BasePolynomialError) as e:
+        raise InvalidPolynomial(str(e) or type(e).__name__)
+
+
+def _check_tokens(poly: str, names: dict):
+    """Raises InvalidPolynomial at the first token that is not a number, a known name or an allowed operator"""
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(poly).readline))
+    except (tokenize.TokenError, SyntaxError) as e:
+        raise InvalidPolynomial(str(e))
+
+    for token in tokens:
+        if token.type in (tokenize.NEWLINE, tokenize.NL, tokenize.ENDMARKER):
+            continue
+        if token.type == tokenize.NUMBER and NUMBER.fullmatch(token.string):
+            continue
+        if token.type == tokenize.NAME and (token.string in names or token.string in FUNCTIONS or
+                                            token.string in CONSTANTS):
+            continue
+        if token.type == tokenize.OP and token.string in OPERATORS:
+            continue
+        raise InvalidPolynomial(f'Unexpected {token.string!r} at position {token.start[1]}')
@@ -50,3 +50,8 @@ class PolyVar(BaseModel):
         ]:
             raise ValueError(f'Distribution type {v} is not supported')
         return v
+
+    def is_numeric(self) -> bool:
+        """Returns True when none of the distribution parameters is symbolic"""
+        params = [self.translation, self.scale, self.beta1, self.beta2]
+        return all(not isinstance(p, sympy.Basic) for p in params)
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Dict, List, Union
+
+
+def normalize_poly(poly: str) -> str:
+    """Polynomial string with insignificant whitespace removed and top-level terms and factors sorted
+
+    Normalisation is lexical, so untrusted input is never parsed on the event loop; reordered sums and products
+    share a form, other equivalent rewritings do not. Whitespace that separates tokens is kept, so input the parser
+    rejects, e.g. '2 3*x0', never shares a key with valid input.
+    """
+    poly = re.sub(r'\s+', ' ', poly.strip())
+    poly = re.sub(' ', lambda match: ' ' if _separates(poly, match.start()) else '', poly)
+    terms = _split(poly, lambda text, i: text[i] in '+-' and i > 0 and text[i - 1] not in '*/(^' and
+                   not (text[i - 1] in 'eE' and i > 1 and text[i - 2].isdigit()), keep=True)
+    normalized = []
+    for term in terms:
+        sign, body = (term[0], term[1:]) if term[0] in '+-' else ('+', term)
+        if '/' not in body:
+            factors = _split(body, lambda text, i: text[i] == '*' and text[i - 1:i] != '*' and
+                             text[i + 1:i + 2] != '*')
+            body = '*'.join(sorted(factors))
+        normalized.append(sign + body)
+    return ''.join(sorted(normalized))
+
+
+def _separates(poly: str, i: int) -> bool:
+    """Whether removing the space at poly[i] would join two tokens into one, e.g. '2 3', '* *' or '1e -3'"""
+    left, right = poly[i - 1], poly[i + 1]
+    if re.match(r'[\w.]', left) and re.match(r'[\w.]', right) or left == right == '*':
+        return True
+    # the exponent sign of a number written with a space, e.g. '1e -3', is not a binary operator
+    return right in '+-' and re.search(r'(^|[^\w.])[\d.]+[eE]$', poly[:i]) is not None
+
+
+def _split(text: str, at, keep: bool = False) -> List[str]:
+    """Splits text outside parentheses at every index i where at(text, i), keeping the separator when keep"""
+    parts, start, depth = [], 0, 0
+    for i, char in enumerate(text):
+        depth += (char == '(') - (char == ')')
+        if depth == 0 and at(text, i):
+            parts.append(text[start:i])
+            start = i if keep else i + 1
+    parts.append(text[start:])
+    return [part for part in parts if part]
+
+
+def model_key(request: Dict) -> str:
+    """Canonical hash of the model in a backend request: polynomial, distributions, simplification policy and engine
+
+    The polynomial is normalised by normalize_poly and variables in dist are sorted, so equivalent models written
+    in a different order share a key.
+    """
+    payload = {
+        'poly': normalize_poly(request.get('poly')),
+        'dist': {k: dict(sorted(dict(v).items())) for k, v in sorted(request.get('dist').items())},
+        'simplify': request.get('simplify'),
+    }
+    if request.get('engine', 'exact') != 'exact':
+        payload.update(engine=request.get('engine'), samples=request.get('samples'), seed=request.get('seed'))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def request_key(request: Dict, method: str, version: str) -> str:
+    """Canonical hash of a backend request; fields that do not affect the result of method are left out"""
+    payload = {
+        'model': model_key(request),
+        'method': method,
+        'order': request.get('order') if method == 'moment' else None,
+        'orders': sorted(set(request.get('orders') or [])) if method == 'stats' else None,
+        'version': version,
+    }
+    if request.get('format', 'text') != 'text':
+        payload['format'] = request.get('format')
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def vector_key(request: Dict, version: str) -> str:
+    """Canonical hash of a backend request for the joint moments of a vector of polynomials"""
+    payload = {
+        'polys': [normalize_poly(poly) for poly in request.get('polys')],
+        'dist': {k: dict(sorted(dict(v).items())) for k, v in sorted(request.get('dist').items())},
+        'simplify': request.get('simplify'),
+        'mixed': [list(m) for m in request.get('mixed') or []],
+        'format': request.get('format', 'text'),
+        'version': version,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ResultCache:
+    """Two-tier cache of backend results: an in-memory LRU in front of a persistent SQLite table
+
+    Entries written by another library version are dropped when the database is opened.
+    """
+    def __init__(self, path: Union[str, None] = None, max_size: int = 1024, version: str = ''):
+        self.max_size = max_size
+        self.version = version
+        self.memory = OrderedDict()
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # persistent tier; disabled when no path is given
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, version TEXT, value TEXT, created REAL)'
+            )
+            self.db.execute('DELETE FROM results WHERE version != ?', (self.version,))
+            self.db.commit()
+
+    def get(self, key: str) -> Union[Dict, None]:
+        """Returns the cached result for key, or None"""
+        with self._lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits['memory'] += 1
+                return self.memory[key]
+
+            if self.db is not None:
+                row = self.db.execute(
+                    'SELECT value FROM results WHERE key = ? AND version = ?', (key, self.version)
+                ).fetchone()
+                if row is not None:
+                    self.hits['disk'] += 1
+                    value = json.loads(row[0])
+                    self._remember(key, value)
+                    return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Dict):
+        """Stores value for key in both tiers"""
+        with self._lock:
+            self._remember(key, value)
+            if self.db is not None:
+                self.db.execute(
+                    'INSERT OR REPLACE INTO results (key, version, value, created) VALUES (?, ?, ?, ?)',
+                    (key, self.version, json.dumps(value), time.time())
+                )
+                self.db.commit()
+
+    def clear(self):
+        """Invalidates every entry"""
+        with self._lock:
+            self.memory.clear()
+            if self.db is not None:
+                self.db.execute('DELETE FROM results')
+                self.db.commit()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            disk_size = self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0] if self.db is not None else 0
+            return {
+                'hits': self.hits['memory'] + self.hits['disk'],
+                'memory_hits': self.hits['memory'],
+                'disk_hits': self.hits['disk'],
+                'misses': self.misses,
+                'memory_size': len(self.memory),
+                'disk_size': disk_size,
+                'version': self.version,
+            }
+
+    def _remember(self, key: str, value: Dict):
+        """Inserts into the in-memory tier, evicting the least recently used entries"""
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
@@ -0,0 +1,104 @@
+import concurrent.futures
+import multiprocessing
+import sympy
+
+from typing import List, Sequence, Tuple
+
+from sparsepoly import SparsePoly, shard_prefixes
+
+
+PARALLEL = ['process', 'ray']
+
+# shards per worker, so that shards finishing early leave no worker idle
+SHARDS_PER_WORKER = 4
+
+# parts and moment tables of the evaluation a pool process serves, loaded once when the process starts
+_PARTS = None
+
+
+def _load(parts: List[Tuple[SparsePoly, List[Sequence]]]):
+    global _PARTS
+    _PARTS = parts
+
+
+def _evaluate(index: int, order: int, prefixes: List[Tuple[int, ...]], chunk_size: int):
+    """Partial expectation of a shard of parts[index] ** order; runs in a pool process"""
+    part, tables = _PARTS[index]
+    return part.power_expectation(order, tables, chunk_size=chunk_size, prefixes=prefixes)
+
+
+def _evaluate_ray(parts: List[Tuple[SparsePoly, List[Sequence]]], index: int, order: int,
+                  prefixes: List[Tuple[int, ...]], chunk_size: int):
+    """Partial expectation of a shard of parts[index] ** order; runs as a Ray task"""
+    part, tables = parts[index]
+    return part.power_expectation(order, tables, chunk_size=chunk_size, prefixes=prefixes)
+
+
+class ShardedExpectation:
+    """Evaluates E[part ** order] for the parts of one computation in parallel shards, reduced by summation
+
+    Shards split the term multiplicities of the multinomial expansion by their leading values (see shard_prefixes).
+    The parts and their moment tables are sent once: as initializer arguments of every process of a pool, or as one
+    object in the store of a local Ray runtime. Workers start on first use and stop on close.
+    """
+    def __init__(self, parts: List[Tuple[SparsePoly, List[Sequence]]], workers: int, parallel: str = 'process',
+                 chunk_size: int = 4096):
+        if parallel not in PARALLEL:
+            raise ValueError(f'Parallel backend {parallel} is not supported')
+        self.parts = parts
+        self.workers = workers
+        self.parallel = parallel
+        self.chunk_size = chunk_size
+        self._executor = None
+        self._parts_ref = None
+        self._remote = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def power_expectation(self, index: int, order: int):
+        """Expectation of parts[index] ** order"""
+        part = self.parts[index][0]
+        shards = shard_prefixes(order, len(part), self.workers * SHARDS_PER_WORKER)
+        if self._executor is None and self._remote is None:
+            self._start()
+
+        if self.parallel == 'ray':
+            import ray
+            results = ray.get([self._remote.remote(self._parts_ref, index, order, prefixes, self.chunk_size)
+                               for prefixes in shards])
+        else:
+            futures = [self._executor.submit(_evaluate, index, order, prefixes, self.chunk_size)
+                       for prefixes in shards]
+            results = [future.result() for future in futures]
+        return sum(results) if part.domain is None else sympy.Add(*results)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        self._parts_ref = None
+        self._remote = None
+
+    def _start(self):
+        if self.parallel == 'ray':
+            try:
+                import ray
+            except ImportError:
+                raise ImportError('Parallel backend ray requires the ray package')
+            if not ray.is_initialized():
+                ray.init(num_cpus=self.workers, include_dashboard=False)
+            self._parts_ref = ray.put(self.parts)
+            self._remote = ray.remote(_evaluate_ray)
+            return
+
+        if multiprocessing.current_process().daemon:
+            # e.g. the worker processes of the REST API
+            raise RuntimeError('Daemonic processes cannot start a process pool; use the ray parallel backend')
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=_load,
+            initargs=(self.parts,)
+        )
@@ -0,0 +1,224 @@
+import heapq
+import itertools
+import math
+import numpy as np
+import sympy
+
+from sympy.polys.constructor import construct_domain
+from typing import Iterator, List, Sequence, Tuple
+
+
+class SparsePoly:
+    """Polynomial stored as an integer exponent matrix (monomials x generators) and a coefficient vector
+
+    Numeric polynomials keep float64 coefficients. Symbolic polynomials keep the coefficients as elements of the
+    sympy domain of the source polynomial in an object array, so products stay expanded and exact.
+    """
+    def __init__(self, exps: np.ndarray, coeffs: np.ndarray, domain=None):
+        self.exps = exps
+        self.coeffs = coeffs
+        self.domain = domain
+
+    @classmethod
+    def from_poly(cls, poly: sympy.Poly, numeric: bool = False) -> 'SparsePoly':
+        """Converts a sympy Poly"""
+        terms = poly.rep.terms()
+        exps = np.array([monom for monom, _ in terms], dtype=np.int64).reshape(len(terms), len(poly.gens))
+        if numeric:
+            coeffs = np.array([float(poly.domain.to_sympy(coeff)) for _, coeff in terms], dtype=np.float64)
+            return cls(exps, coeffs)
+
+        return cls(exps, _object_array([coeff for _, coeff in terms]), domain=poly.domain)
+
+    def one(self) -> 'SparsePoly':
+        """Constant polynomial 1 over the same generators and coefficient domain"""
+        exps = np.zeros((1, self.exps.shape[1]), dtype=np.int64)
+        if self.domain is None:
+            return SparsePoly(exps, np.ones(1, dtype=np.float64))
+        return SparsePoly(exps, _object_array([self.domain.one]), domain=self.domain)
+
+    def __len__(self):
+        return len(self.coeffs)
+
+    def __getstate__(self):
+        # domain elements do not pickle, so symbolic coefficients travel as sympy expressions
+        if self.domain is None:
+            return self.__dict__
+        return {'exps': self.exps, 'coeffs': [self.domain.to_sympy(coeff) for coeff in self.coeffs], 'domain': None,
+                'symbolic': True}
+
+    def __setstate__(self, state):
+        if state.pop('symbolic', False):
+            domain, coeffs = construct_domain(state['coeffs']) if state['coeffs'] else (sympy.ZZ, [])
+            state = {**state, 'coeffs': _object_array(coeffs), 'domain': domain}
+        self.__dict__.update(state)
+
+    def __mul__(self, other: 'SparsePoly') -> 'SparsePoly':
+        # every pair of monomials, then equal monomials merged
+        exps = (self.exps[:, None, :] + other.exps[None, :, :]).reshape(-1, self.exps.shape[1])
+        coeffs = np.multiply.outer(self.coeffs, other.coeffs).ravel()
+        return SparsePoly(*merge(exps, coeffs), domain=self.domain)
+
+    def expectation(self, tables: List[Sequence]):
+        """Expectation given tables[j][m] = E[g_j^m] for every generator g_j
+
+        Values are gathered from the tables for the whole exponent matrix, multiplied along rows and summed with
+        the coefficients. Symbolic results are rebuilt as a single sympy expression.
+        """
+        numeric = self.domain is None
+        evals = np.ones(len(self), dtype=np.float64) if numeric else _object_array([1] * len(self))
+        for g_index, table in enumerate(tables):
+            column = self.exps[:, g_index]
+            if not column.any():
+                continue
+            values = list(table[:int(column.max()) + 1])
+            evals = evals * (np.array(values, dtype=np.float64) if numeric else _object_array(values))[column]
+
+        if numeric:
+            return float(self.coeffs @ evals)
+        coeffs = [self.domain.to_sympy(coeff) for coeff in self.coeffs]
+        return sympy.Add(*[coeff * ev for coeff, ev in zip(coeffs, evals)])
+
+    def power_expectation(self, order: int, tables: List[Sequence], chunk_size: int = 4096,
+                          prefixes: List[Tuple[int, ...]] = None):
+        """Expectation of self ** order without expanding it, in memory bounded by chunk_size
+
+        Monomials of the multinomial expansion are generated lazily as term multiplicities (n_1, ..., n_T) summing
+        to order, chunk_size at a time; every chunk is merged, reduced to its expectation and added to the total.
+        With prefixes, only the multiplicities starting with one of them are summed; see shard_prefixes.
+        """
+        if order == 0 and prefixes is None:
+            return self.one().expectation(tables)
+        numeric = self.domain is None
+        total = 0.0 if numeric else sympy.Integer(0)
+
+        # powers of every coefficient, and factorials for the multinomial coefficients
+        if numeric:
+            powers = self.coeffs[:, None] ** np.arange(order + 1)
+        else:
+            powers = np.empty((len(self), order + 1), dtype=object)
+            for t, coeff in enumerate(self.coeffs):
+                powers[t, 0] = self.domain.one
+                for k in range(1, order + 1):
+                    powers[t, k] = powers[t, k - 1] * coeff
+        factorials = _object_array([math.factorial(k) for k in range(order + 1)])
+
+        terms = np.arange(len(self))
+        for prefix in [()] if prefixes is None else prefixes:
+            for counts in compositions(order - sum(prefix), len(self) - len(prefix), chunk_size):
+                if prefix:
+                    counts = np.hstack([np.tile(np.array(prefix, dtype=np.int64), (len(counts), 1)), counts])
+                exps = counts @ self.exps
+                multinomials = factorials[order] // np.prod(factorials[counts], axis=1)
+                coeffs = np.prod(powers[terms, counts], axis=1)
+                coeffs = coeffs * (multinomials.astype(np.float64) if numeric else multinomials)
+                total = total + SparsePoly(*merge(exps, coeffs), domain=self.domain).expectation(tables)
+        return total
+
+    def components(self, labels: Sequence) -> List:
+        """Splits into additive parts over disjoint sets of variables, labels[j] naming the variable of column j
+
+        Returns (columns, part) pairs, part holding only the given columns. Variables that share a monomial end up
+        in the same part; a constant term goes to the first part.
+        """
+        parent = {label: label for label in labels}
+
+        def find(label):
+            while parent[label] != label:
+                parent[label] = parent[parent[label]]
+                label = parent[label]
+            return label
+
+        # union of the variables of every monomial
+        row_labels = [[labels[j] for j in np.flatnonzero(row)] for row in self.exps]
+        for used in row_labels:
+            for label in used[1:]:
+                parent[find(label)] = find(used[0])
+
+        roots = list(dict.fromkeys(find(labels[j]) for j in np.flatnonzero(self.exps.any(axis=0))))
+        if len(roots) < 2:
+            return [(list(range(self.exps.shape[1])), self)]
+
+        parts = []
+        for root in roots:
+            columns = [j for j, label in enumerate(labels) if find(label) == root]
+            rows = [i for i, used in enumerate(row_labels) if (find(used[0]) == root if used else root == roots[0])]
+            parts.append((columns, SparsePoly(self.exps[rows][:, columns], self.coeffs[rows], domain=self.domain)))
+        return parts
+
+    def as_poly(self, *gens) -> sympy.Poly:
+        """Rebuilds a sympy Poly over gens"""
+        terms = {tuple(int(e) for e in monom): (coeff if self.domain is None else self.domain.to_sympy(coeff))
+                 for monom, coeff in zip(self.exps, self.coeffs)}
+        return sympy.Poly.from_dict(terms, *gens)
+
+
+def merge(exps: np.ndarray, coeffs: np.ndarray):
+    """Sums the coefficients of equal rows of an exponent matrix and drops zero terms"""
+    # pack every row into one integer key (mixed radix on the column degrees) so that rows sort as scalars
+    radix = exps.max(axis=0, initial=0).astype(np.int64) + 1
+    if exps.size and np.log2(radix.astype(np.float64)).sum() < 62:
+        weights = np.concatenate([np.cumprod(radix[::-1])[::-1][1:], [1]]).astype(np.int64)
+        _, index, inverse = np.unique(exps @ weights, return_index=True, return_inverse=True)
+        exps = exps[index]
+    else:
+        exps, inverse = np.unique(exps, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    if coeffs.dtype == object:
+        order = np.argsort(inverse, kind='stable')
+        starts = np.flatnonzero(np.r_[True, np.diff(inverse[order]) != 0])
+        coeffs = np.add.reduceat(coeffs[order], starts)
+    else:
+        coeffs = np.bincount(inverse, weights=coeffs, minlength=len(exps))
+
+    nonzero = coeffs != 0
+    if not nonzero.all():
+        exps, coeffs = exps[nonzero], coeffs[nonzero]
+    return exps, coeffs
+
+
+def compositions(n: int, k: int, chunk_size: int) -> Iterator[np.ndarray]:
+    """Yields every k-tuple of non-negative integers summing to n, as int64 arrays of at most chunk_size rows"""
+    if k == 0:
+        if n == 0:
+            yield np.zeros((1, 0), dtype=np.int64)
+        return
+
+    # stars and bars: k - 1 bar positions among n + k - 1 slots
+    bars = itertools.combinations(range(n + k - 1), k - 1)
+    while True:
+        chunk = list(itertools.islice(bars, chunk_size))
+        if not chunk:
+            return
+        bounds = np.array(chunk, dtype=np.int64).reshape(len(chunk), k - 1)
+        bounds = np.hstack([np.full((len(chunk), 1), -1), bounds, np.full((len(chunk), 1), n + k - 1)])
+        yield np.diff(bounds, axis=1) - 1
+
+
+def shard_prefixes(n: int, k: int, shards: int) -> List[List[Tuple[int, ...]]]:
+    """Splits the k-tuples summing to n into at most shards groups of leading values of about equal size
+
+    Prefixes are lengthened until there are several per shard, then dealt largest first to the smallest group. The
+    tuples starting with the prefixes of a group are disjoint from those of every other group and cover them all.
+    """
+    def size(prefix):
+        return math.comb(n - sum(prefix) + k - len(prefix) - 1, k - len(prefix) - 1)
+
+    # every prefix is lengthened by one value at a time; the last value of a tuple follows from the others
+    prefixes = [()]
+    while len(prefixes) < 4 * shards and len(prefixes[0]) < k - 1:
+        prefixes = [p + (j,) for p in prefixes for j in range(n - sum(p) + 1)]
+
+    groups = [(0, g, []) for g in range(shards)]
+    for prefix in sorted(prefixes, key=size, reverse=True):
+        total, g, group = heapq.heappop(groups)
+        group.append(prefix)
+        heapq.heappush(groups, (total + size(prefix), g, group))
+    return [group for _, _, group in sorted(groups, key=lambda item: item[1]) if group]
+
+
+def _object_array(values) -> np.ndarray:
+    """1-D object array of values, which numpy would otherwise try to unpack"""
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
@@ -0,0 +1,46 @@
+from instrumentation import Metrics, ServiceMetrics, server_timing
+from polymoment import PolyMoment
+
+
+def test_polymoment_metrics():
+    """Test phase timings and counters recorded by PolyMoment"""
+    metrics = Metrics()
+    polymoment = PolyMoment(
+        poly='x0**2 + x0*x1',
+        dist={
+            'x0': {'distribution': 'normal', 'type': 'symmetrical', 'translation': 'm0', 'scale': 's0'},
+            'x1': {'distribution': 'uniform', 'type': 'symmetrical', 'translation': 'm1', 'scale': 's1'},
+        },
+        metrics=metrics
+    )
+    polymoment.moment(order=2)
+    assert set(metrics.phases) == {'parse', 'expand', 'expectation', 'simplify'}
+    # 1, then the 2 and 3 monomials of the first and second power
+    assert metrics.counters['monomials'] == 1 + 2 + 3
+    assert metrics.counters['table_misses'] == 4 + 2
+
+    # entries computed for order 2 are reused
+    polymoment.moment(order=2)
+    assert metrics.counters['table_hits'] == 4 + 2
+    assert 'dur=' in server_timing(metrics.phases)
+
+
+def test_service_metrics():
+    """Test Prometheus text format of the service metrics"""
+    metrics = ServiceMetrics(buckets=[0.1, 1])
+    with metrics.track():
+        assert metrics.in_flight == 1
+    metrics.observe(method='var', status=200, seconds=0.5)
+    metrics.observe(method='var', status=200, seconds=2)
+    metrics.record({'phases': {'expand': 0.25}, 'counters': {'monomials': 10}})
+
+    lines = metrics.render(gauges={'pool_size': 2}).splitlines()
+    assert 'polymoment_request_duration_seconds_bucket{method="var",le="0.1"} 0' in lines
+    assert 'polymoment_request_duration_seconds_bucket{method="var",le="1"} 1' in lines
+    assert 'polymoment_request_duration_seconds_bucket{method="var",le="+Inf"} 2' in lines
+    assert 'polymoment_request_duration_seconds_count{method="var"} 2' in lines
+    assert 'polymoment_requests_total{method="var",status="200"} 2' in lines
+    assert 'polymoment_requests_in_flight 0' in lines
+    assert 'polymoment_phase_seconds_total{phase="expand"} 0.250000' in lines
+    assert 'polymoment_monomials_total 10' in lines
+    assert '# TYPE polymoment_pool_size gauge' in lines
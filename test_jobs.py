@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+
+from jobs import JobQueue, QueueFull
+
+
+def test_job_queue():
+    """Test coalescing, bounds, cancellation, failures and expiry of background jobs"""
+    calls = []
+
+    def work(value, delay=0.1):
+        async def fn():
+            calls.append(value)
+            await asyncio.sleep(delay)
+            if value is None:
+                raise ValueError('no value')
+            return value
+        return fn
+
+    async def main():
+        queue = JobQueue(max_jobs=2, concurrency=1, ttl=0.5)
+
+        # identical submissions share one job and one computation
+        a = queue.submit(key='a', method='mean', fn=work(1))
+        assert queue.submit(key='a', method='mean', fn=work(1)) is a
+        assert a.submissions == 2
+
+        # the second job waits for the only slot, a third one does not fit
+        b = queue.submit(key='b', method='mean', fn=work(2, delay=10))
+        with pytest.raises(QueueFull):
+            queue.submit(key='c', method='mean', fn=work(3))
+        await asyncio.sleep(0.2)
+        assert (a.status, a.result, b.status) == ('done', 1, 'running')
+        assert calls == [1, 2]
+
+        # cancelled jobs are not shared with later submissions
+        queue.cancel(b.id)
+        await asyncio.sleep(0)
+        assert b.status == 'cancelled' and b.task.done()
+        assert queue.submit(key='b', method='mean', fn=work(2, delay=0)) is not b
+
+        # a shared job keeps running until every submitter has cancelled it
+        shared = queue.submit(key='e', method='mean', fn=work(5, delay=0.05))
+        assert queue.submit(key='e', method='mean', fn=work(5, delay=0.05)) is shared
+        queue.cancel(shared.id)
+        assert not shared.final and shared.submissions == 1
+        await asyncio.sleep(0.1)
+        assert (shared.status, shared.result) == ('done', 5)
+
+        failed = queue.submit(key='d', method='mean', fn=work(None, delay=0))
+        await asyncio.sleep(0.05)
+        assert (failed.status, failed.error) == ('failed', 'no value')
+        assert queue.stats() == {'queued': 0, 'running': 0, 'done': 3, 'failed': 1, 'cancelled': 1, 'coalesced': 2}
+
+        # finished jobs expire after ttl
+        await asyncio.sleep(0.6)
+        assert queue.get(a.id) is None
+        assert queue.submit(key='a', method='mean', fn=work(1)) is not a
+
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+import sympy
+
+from instrumentation import Metrics
+from main_backend import MODELS, build, compute, compute_batch, compute_vector, estimate_batch
+from wireformat import from_wire
+
+
+REQUEST = {
+    'poly': 'x0**2 + x0*x1',
+    'dist': {
+        'x0': {'distribution': 'normal', 'type': 'symmetrical', 'translation': 'm0', 'scale': 's0'},
+        'x1': {'distribution': 'uniform', 'type': 'one_sided_right', 'translation': 'm1', 'scale': 's1'},
+    },
+    'order': None,
+    'orders': None,
+    'simplify': 'cheap',
+}
+
+
+def test_compute_batch():
+    """Test batch computation against single requests"""
+    requests = [
+        {**REQUEST, 'order': 3},
+        REQUEST,
+        {**REQUEST, 'poly': 'x0'},
+        REQUEST,
+        {**REQUEST, 'orders': [2]},
+    ]
+    methods = ['moment', 'skew', 'mean', 'var', 'stats']
+    results = compute_batch(requests=requests, methods=methods)
+
+    assert results[0] == compute(request=requests[0], method='moment')
+    assert results[1] == compute(request=REQUEST, method='skew')
+    assert results[2] == {'result': 'm0'}
+    assert results[3] == compute(request=REQUEST, method='var')
+    assert results[4]['var'] == results[3]['result']
+    assert results[4]['moments'] == {2: compute(request={**REQUEST, 'order': 2}, method='moment')['result']}
+
+
+def test_model_cache():
+    """Test that requests with the same model reuse one built PolyMoment and record cache hits"""
+    MODELS.clear()
+    metrics = Metrics()
+    polymoment = build(REQUEST, metrics=Metrics())
+    assert build({**REQUEST, 'poly': 'x0*x1 + x0**2'}, metrics=metrics) is polymoment
+    assert polymoment.metrics is metrics and metrics.counters == {'model_cache_hits': 1}
+    assert build({**REQUEST, 'simplify': 'full'}) is not polymoment
+    assert compute(request=REQUEST, method='var') == compute(request={**REQUEST, 'order': 2}, method='var')
+
+
+def test_compute_cse_format():
+    """Test results in the cse wire format against plain text results"""
+    requests = [{**REQUEST, 'format': 'cse'}, {**REQUEST, 'format': 'cse', 'orders': [3]}]
+    results = compute_batch(requests=requests, methods=['skew', 'stats'])
+    assert from_wire(results[0]['result']) == sympy.sympify(compute(request=REQUEST, method='skew')['result'])
+    moment = compute(request={**REQUEST, 'order': 3}, method='moment')['result']
+    assert from_wire(results[1]['moments'][3]) == sympy.sympify(moment)
+
+
+def test_compute_approximate():
+    """Test the approximate engine against exact results"""
+    request = {
+        **REQUEST,
+        'dist': {
+            'x0': {'distribution': 'normal', 'type': 'symmetrical', 'translation': '1.0', 'scale': '0.5'},
+            'x1': {'distribution': 'uniform', 'type': 'one_sided_right', 'translation': '2.0', 'scale': '1.5'},
+        },
+        'engine': 'approximate',
+        'samples': 50000,
+        'seed': 0,
+    }
+    results = compute_batch(requests=[{**request, 'order': 2}, request], methods=['moment', 'var'])
+    low, high = results[1]['interval']
+    assert low < float(results[1]['result']) < high
+    # exact variance of x0**2 + x0*x1 for these parameters
+    assert low < 6.0 < high
+
+
+def test_estimate_batch():
+    """Test cost estimates of batches, one per shared model"""
+    estimates = estimate_batch(requests=[REQUEST, REQUEST, {**REQUEST, 'poly': 'x0'}], methods=['mean', 'kurt', 'var'])
+    assert len(estimates) == 2
+    assert estimates[0]['cost'] > estimate_batch(requests=[REQUEST], methods=['var'])[0]['cost']
+    assert estimates[1]['monomials'] < estimates[0]['monomials']
+    assert estimate_batch(requests=[{**REQUEST, 'engine': 'approximate'}], methods=['kurt']) == []
+    # a moment without order is rejected by admission, not by a failing estimate
+    assert estimate_batch(requests=[REQUEST], methods=['moment'])[0]['cost'] >= 0
+
+
+def test_compute_vector():
+    """Test joint moments of a vector of polynomials against single requests"""
+    request = {'polys': [REQUEST['poly'], 'x1'], 'dist': REQUEST['dist'], 'mixed': [[0, 1, 1, 1]], 'simplify': 'cheap'}
+    result = compute_vector(request=request)
+    assert result['mean'] == [compute(request=REQUEST, method='mean')['result'], 'm1 + s1/2']
+    assert result['cov'][0][0] == compute(request=REQUEST, method='var')['result']
+    assert result['mixed'] == [compute(request={**REQUEST, 'poly': f'({REQUEST["poly"]})*x1', 'order': 1},
+                                       method='moment')['result']]
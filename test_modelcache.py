@@ -0,0 +1,19 @@
+from modelcache import ModelCache
+
+
+def test_model_cache():
+    """Test LRU eviction and hit/miss counters of the model cache"""
+    cache = ModelCache(max_size=2)
+    assert cache.get('a') is None
+    a, b, c = object(), object(), object()
+    cache.set('a', a)
+    cache.set('b', b)
+    assert cache.get('a') is a
+    cache.set('c', c)
+    assert cache.get('b') is None
+    assert cache.get('a') is a and cache.get('c') is c
+    assert cache.stats() == {'hits': 3, 'misses': 2, 'size': 2, 'max_size': 2}
+
+    disabled = ModelCache(max_size=0)
+    disabled.set('a', a)
+    assert disabled.get('a') is None and len(disabled) == 0
@@ -0,0 +1,92 @@
+import asyncio
+import sympy
+
+from momentregistry import REGISTRY, MomentRegistry, load_snapshot, precompute
+from momenttable import MomentTable
+from polyvar import PolyVar
+from workerpool import WorkerPool
+
+
+def _registry_orders(key: tuple) -> int:
+    """Number of standardised moments of key held by the registry of a worker"""
+    from momentregistry import REGISTRY
+    return len(REGISTRY._entries.get(key, ([], []))[1])
+
+
+def test_moment_registry(tmp_path):
+    """Test sharing, placeholder substitution and snapshots of the moment registry"""
+    registry = MomentRegistry()
+    a = MomentTable(PolyVar(distribution='beta', type='symmetrical', translation='m0', scale='s0', beta1='a0',
+                            beta2='b0'), registry=registry)
+    b = MomentTable(PolyVar(distribution='beta', type='symmetrical', translation='m1', scale='s1', beta1='a1',
+                            beta2='b1'), registry=registry)
+    assert a.key == b.key
+    a.grow(6)
+    b.grow(4)
+    assert len(registry) == 1
+    assert (registry.hits, registry.misses) == (1, 1)
+
+    # entries carry placeholders, tables carry their own parameters
+    a0, b0, a1, b1 = sympy.symbols('a0 b0 a1 b1')
+    assert sympy.simplify(b.standard[4] - a.standard[4].subs({a0: a1, b0: b1})) == 0
+    assert not b.raw[4].free_symbols & {sympy.Symbol('_beta1'), sympy.Symbol('_beta2')}
+
+    # numeric parameters get entries of their own
+    c = MomentTable(PolyVar(distribution='beta', type='symmetrical', translation=0, scale=1, beta1=2, beta2=3),
+                    registry=registry)
+    assert abs(c[2] - float(b.standard[2].subs({a1: 2, b1: 3}))) < 1e-12
+    assert len(registry) == 2
+
+    # snapshots restore every entry into a new registry and into worker processes
+    path = str(tmp_path / 'moments.pkl')
+    registry.save(path)
+    restored = MomentRegistry()
+    restored.load(path)
+    assert len(restored) == 2
+    d = MomentTable(PolyVar(distribution='beta', type='symmetrical', translation='m2', scale='s2', beta1='a2',
+                            beta2='b2'), registry=restored)
+    d.grow(6)
+    assert (restored.hits, restored.misses) == (1, 0)
+
+    async def main():
+        pool = WorkerPool(size=1, initializer=load_snapshot, initargs=(path,))
+        try:
+            return await pool.run(_registry_orders, a.key)
+        finally:
+            pool.shutdown()
+
+    assert asyncio.run(main()) == 7
+
+
+def test_precomputed_snapshot(tmp_path):
+    """Test that a precomputed snapshot serves requests of every distribution family"""
+    precompute(order=4)
+    path = str(tmp_path / 'moments.pkl')
+    REGISTRY.save(path)
+    registry = MomentRegistry()
+    registry.load(path)
+    size = len(registry)
+
+    for params in [
+        PolyVar(distribution='normal', type='symmetrical', translation='m0', scale='s0'),
+        PolyVar(distribution='gamma', type='one_sided_right', translation='m1', scale='s1', beta1='k1'),
+        PolyVar(distribution='beta', type='one_sided_left', translation='m2', scale='s2', beta1='a2', beta2='b2'),
+    ]:
+        MomentTable(params, registry=registry).grow(4)
+    assert (registry.hits, registry.misses) == (3, 0)
+    assert len(registry) == size
+
+
+def test_moment_registry_eviction():
+    """Test that numeric shape parameters cannot grow the registry beyond max_size"""
+    registry = MomentRegistry(max_size=2)
+    tables = [MomentTable(PolyVar(distribution='gamma', type='one_sided_right', translation=0, scale=1, beta1=beta1),
+                          registry=registry) for beta1 in [1.5, 2.5, 3.5]]
+    for table in tables:
+        table.grow(4)
+    assert len(registry) == 2
+    assert tables[0].key not in registry._entries
+
+    # evicted entries are computed again when needed
+    assert abs(MomentTable(tables[0].params, registry=registry)[2] - tables[0][2]) < 1e-12
+    assert (registry.hits, registry.misses) == (0, 4)
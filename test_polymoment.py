@@ -1,4 +1,10 @@
-from polymoment import PolyMoment
+import math
+import numpy as np
+import pytest
+import sympy
+
+import polymoment
+from polymoment import PolyMoment, PolyMomentVector
 
 
 def test_gaussian_distribution():
@@ -61,9 +67,8 @@ def test_weibull_distribution():
     # mean, var, skew, kurt
     assert polymoment.mean().__str__() == 'm0 + s0*gamma(1 + 1/b0)'
     assert polymoment.var().__str__() == 's0**2*(-gamma(1 + 1/b0)**2 + gamma(1 + 2/b0))'
-    assert polymoment.skew().__str__() == '-s0*(2*gamma(1 + 1/b0)**3 - 3*gamma(1 + 1/b0)*gamma(1 + 2/b0) + gamma(1 + ' \
-                                          '3/b0))/(sqrt(-s0**2*(gamma(1 + 1/b0)**2 - gamma(1 + 2/b0)))*(gamma(1 + ' \
-                                          '1/b0)**2 - gamma(1 + 2/b0)))'
+    assert polymoment.skew().__str__() == 's0**3*(2*gamma(1 + 1/b0)**3 - 3*gamma(1 + 1/b0)*gamma(1 + 2/b0) + ' \
+                                          'gamma(1 + 3/b0))/(-s0**2*(gamma(1 + 1/b0)**2 - gamma(1 + 2/b0)))**(3/2)'
     assert polymoment.kurt().__str__() == '(-3*gamma(1 + 1/b0)**4 + 6*gamma(1 + 1/b0)**2*gamma(1 + 2/b0) - 4*gamma(1 ' \
                                           '+ 1/b0)*gamma(1 + 3/b0) + gamma(1 + 4/b0))/(gamma(1 + 1/b0)**2 - gamma(1 +' \
                                           ' 2/b0))**2'
@@ -110,3 +115,393 @@ def test_gamma_distribution():
     assert polymoment.var().__str__() == 'b0*s0**2'
     assert polymoment.skew().__str__() == '2*s0/sqrt(b0*s0**2)'
     assert polymoment.kurt().__str__() == '3 + 6/b0'
+
+
+def test_numeric_backend():
+    """Test numeric backend against symbolic backend"""
+    dist = {
+        'x0': {
+            'distribution': 'normal',
+            'type': 'symmetrical',
+            'translation': 1.0,
+            'scale': 2.0
+        },
+        'x1': {
+            'distribution': 'gamma',
+            'type': 'one_sided_right',
+            'translation': 0.5,
+            'scale': 1.5,
+            'beta1': 2.0
+        },
+        'x2': {
+            'distribution': 'beta',
+            'type': 'one_sided_right',
+            'translation': -1.0,
+            'scale': 3.0,
+            'beta1': 2.0,
+            'beta2': 5.0
+        }
+    }
+    poly = 'x0**2 + 3*x0*x1 - x1*x2**2 + x2'
+    numeric = PolyMoment(poly=poly, dist=dist)
+    symbolic = PolyMoment(poly=poly, dist=dist, backend='symbolic')
+
+    assert numeric.backend == 'numeric'
+    for method in ['mean', 'var', 'std', 'skew', 'kurt']:
+        result = getattr(numeric, method)()
+        assert isinstance(result, float)
+        assert math.isclose(result, float(getattr(symbolic, method)()), rel_tol=1e-9)
+    assert math.isclose(numeric.moment(order=5), float(symbolic.moment(order=5)), rel_tol=1e-9)
+
+
+def test_compiled_statistic():
+    """Test compiled statistic against substitution into the symbolic result"""
+    polymoment = PolyMoment(
+        poly='x0**2 + x1',
+        dist={
+            'x0': {
+                'distribution': 'weibull',
+                'type': 'one_sided_right',
+                'translation': 'm0',
+                'scale': 's0',
+                'beta1': 'b0'
+            },
+            'x1': {
+                'distribution': 'normal',
+                'type': 'symmetrical',
+                'translation': 'm1',
+                'scale': 's1'
+            }
+        }
+    )
+    assert [p.name for p in polymoment.params()] == ['m0', 's0', 'b0', 'm1', 's1']
+
+    var = polymoment.compile('var')
+    assert polymoment.compile('var') is var
+
+    b0 = np.linspace(1.0, 5.0, 7)
+    s0 = np.linspace(0.5, 2.0, 3)[:, None]
+    result = var({'m0': 1.0, 's0': s0, 'b0': b0, 'm1': 0.0, 's1': 2.0})
+    assert result.shape == (3, 7)
+
+    expected = float(polymoment.var().subs({'m0': 1.0, 's0': 2.0, 'b0': 3.0, 'm1': 0.0, 's1': 2.0}))
+    assert math.isclose(result[2, 3], expected, rel_tol=1e-9)
+    assert math.isclose(var(1.0, 2.0, 3.0, 0.0, 2.0), expected, rel_tol=1e-9)
+
+
+def test_moment_table():
+    """Test per-variable moment tables built by recurrence"""
+    polymoment = PolyMoment(
+        poly='x0 + x1',
+        dist={
+            'x0': {
+                'distribution': 'normal',
+                'type': 'symmetrical',
+                'translation': 'm0',
+                'scale': 's0'
+            },
+            'x1': {
+                'distribution': 'maxwell',
+                'type': 'one_sided_right',
+                'translation': 0.0,
+                'scale': 1.0
+            }
+        }
+    )
+    table = polymoment.tables['x0']
+    assert table[2].__str__() == 'm0**2 + s0**2'
+    assert len(table) == 3
+    table.grow(6)
+    assert table.standard == [1, 0, 1, 0, 3, 0, 15]
+
+    # E[V^0] = 1 and the Maxwell mean is 2 * sqrt(2 / pi)
+    assert polymoment.tables['x1'][0] == 1
+    assert math.isclose(float(polymoment.tables['x1'][1]), 2 * math.sqrt(2 / math.pi))
+
+    table.max_order = 8
+    with pytest.raises(ValueError):
+        table.grow(9)
+
+    # student moments of order k exist only for beta1 > k
+    student = {'distribution': 'student', 'type': 'symmetrical', 'translation': 0.0, 'scale': 1.0, 'beta1': 4}
+    assert math.isclose(PolyMoment(poly='x0', dist={'x0': student}).var(), 2.0)
+    with pytest.raises(ValueError, match='beta1 > 4'):
+        PolyMoment(poly='x0', dist={'x0': student}).kurt()
+
+
+def test_moments_and_stats():
+    """Test single-pass moments and statistics against the individual methods"""
+    polymoment = PolyMoment(
+        poly='x0**2 + x0*x1',
+        dist={
+            'x0': {
+                'distribution': 'normal',
+                'type': 'symmetrical',
+                'translation': 'm0',
+                'scale': 's0'
+            },
+            'x1': {
+                'distribution': 'uniform',
+                'type': 'one_sided_right',
+                'translation': 'm1',
+                'scale': 's1'
+            }
+        }
+    )
+    moments = polymoment.moments(orders=[0, 1, 3])
+    assert list(moments) == [0, 1, 3]
+    assert moments[0] == 1
+    assert moments[3] == polymoment.moment(order=3)
+
+    stats = polymoment.stats()
+    assert stats['mean'] == polymoment.mean()
+    assert stats['var'] == polymoment.var()
+    assert stats['std'] == polymoment.std()
+    assert stats['skew'] == polymoment.skew()
+    assert stats['kurt'] == polymoment.kurt()
+
+
+def test_simplification_policy():
+    """Test simplification policies give equivalent statistics"""
+    dist = {
+        'x0': {
+            'distribution': 'gamma',
+            'type': 'one_sided_right',
+            'translation': 'm0',
+            'scale': 's0',
+            'beta1': 'b0'
+        }
+    }
+    full = PolyMoment(poly='x0**2', dist=dist)
+    for policy in ['none', 'cheap']:
+        polymoment = PolyMoment(poly='x0**2', dist=dist, simplify=policy)
+        for method in ['mean', 'var', 'skew', 'kurt']:
+            assert sympy.simplify(getattr(polymoment, method)() - getattr(full, method)()) == 0
+
+    assert PolyMoment(poly='x0', dist=dist, simplify='cheap').var().__str__() == 'b0*s0**2'
+    with pytest.raises(ValueError):
+        PolyMoment(poly='x0', dist=dist, simplify='fast')
+
+
+def test_central_moment():
+    """Test central moments against raw moments"""
+    polymoment = PolyMoment(
+        poly='x0**2 + x0*x1',
+        dist={
+            'x0': {
+                'distribution': 'laplace',
+                'type': 'symmetrical',
+                'translation': 'm0',
+                'scale': 's0'
+            },
+            'x1': {
+                'distribution': 'triangular',
+                'type': 'one_sided_right',
+                'translation': 'm1',
+                'scale': 's1'
+            }
+        }
+    )
+    e1, e2, e3 = polymoment.moment(order=1), polymoment.moment(order=2), polymoment.moment(order=3)
+    assert polymoment.central_moment(order=1) == 0
+    assert sympy.simplify(polymoment.central_moment(order=2) - (e2 - e1 ** 2)) == 0
+    assert sympy.simplify(polymoment.central_moment(order=3) - (e3 - 3 * e1 * e2 + 2 * e1 ** 3)) == 0
+
+
+def test_central_moment_cancellation():
+    """Test numeric central moments of a variable with a large translation"""
+    polymoment = PolyMoment(
+        poly='x0**2',
+        dist={
+            'x0': {
+                'distribution': 'normal',
+                'type': 'symmetrical',
+                'translation': 1e6,
+                'scale': 1.0
+            }
+        }
+    )
+    assert polymoment.var() == 4e12 + 2
+    assert math.isclose(polymoment.kurt(), 3.0, rel_tol=1e-9)
+
+
+def test_iter_moments():
+    """Test moments yielded in increasing order"""
+    polymoment = PolyMoment(
+        poly='x0**2 + x0',
+        dist={
+            'x0': {
+                'distribution': 'uniform',
+                'type': 'symmetrical',
+                'translation': 'm0',
+                'scale': 's0'
+            }
+        }
+    )
+    moments = polymoment.iter_moments(orders=[3, 1, 2])
+    assert next(moments) == (1, polymoment.moment(order=1))
+    assert [order for order, _ in moments] == [2, 3]
+
+
+def test_independent_decomposition():
+    """Test moments of polynomials with additive parts over independent variables"""
+    # sum of squares of standard normals is chi-squared with n degrees of freedom
+    n = 20
+    polymoment = PolyMoment(
+        poly=' + '.join(f'x{i}**2' for i in range(n)),
+        dist={
+            f'x{i}': {'distribution': 'normal', 'type': 'symmetrical', 'translation': 0, 'scale': 1} for i in range(n)
+        }
+    )
+    stats = polymoment.stats()
+    assert stats['mean'] == n
+    assert stats['var'] == 2 * n
+    assert math.isclose(stats['skew'], math.sqrt(8 / n))
+    assert math.isclose(stats['kurt'], 3 + 12 / n)
+
+    # coupled and independent parts together, against the joint expansion of the same polynomial
+    dist = {
+        'x0': {'distribution': 'normal', 'type': 'symmetrical', 'translation': 'm0', 'scale': 's0'},
+        'x1': {'distribution': 'uniform', 'type': 'symmetrical', 'translation': 'm1', 'scale': 's1'},
+        'x2': {'distribution': 'normal', 'type': 'symmetrical', 'translation': 'm2', 'scale': 's2'},
+    }
+    polymoment = PolyMoment(poly='x0**2 + x0*x1 + 3*x2 - 1', dist=dist, simplify='none')
+    joint = sympy.Poly(polymoment.poly.as_expr() ** 3, *polymoment.poly.gens)
+    assert sympy.expand(polymoment.moment(order=3) - polymoment.expectation(joint)) == 0
+
+
+def test_approximate_engine():
+    """Test quasi-Monte-Carlo estimates against the exact engine"""
+    polymoment = PolyMoment(
+        poly='x0**2 + x0*x1 + x1',
+        dist={
+            'x0': {'distribution': 'weibull', 'type': 'one_sided_right', 'translation': 0.3, 'scale': 1.2,
+                   'beta1': 1.5},
+            'x1': {'distribution': 'trapezoidal', 'type': 'symmetrical', 'translation': 1.0, 'scale': 0.5,
+                   'beta1': 0.4},
+        }
+    )
+    for method, order in [('moment', 3), ('mean', None), ('var', None), ('skew', None)]:
+        exact = polymoment.moment(order=order) if method == 'moment' else getattr(polymoment, method)()
+        estimate = polymoment.approximate(method=method, order=order, samples=100000, seed=0)
+        assert estimate['low'] < estimate['value'] < estimate['high']
+        assert abs(estimate['value'] - exact) < 4 * estimate['stderr']
+
+    with pytest.raises(ValueError):
+        PolyMoment(poly='x0', dist={'x0': {'distribution': 'normal', 'type': 'symmetrical', 'translation': 'm0',
+                                          'scale': 1.0}}).approximate(method='mean')
+
+
+def test_streaming_expansion():
+    """Test moments streamed in chunks of monomials against the full expansion"""
+    dist = {
+        'x0': {'distribution': 'normal', 'type': 'symmetrical', 'translation': 'm0', 'scale': 's0'},
+        'x1': {'distribution': 'beta', 'type': 'one_sided_right', 'translation': 'm1', 'scale': 's1', 'beta1': 'a1',
+               'beta2': 'b1'},
+        'x2': {'distribution': 'laplace', 'type': 'symmetrical', 'translation': 'm2', 'scale': 's2'},
+    }
+    poly = 'x0**2 + 2*x0*x1 - x1 + x2**2/3'
+    full = PolyMoment(poly=poly, dist=dist, simplify='none')
+    streamed = PolyMoment(poly=poly, dist=dist, simplify='none', chunk_size=3)
+    for order in range(5):
+        assert sympy.expand(streamed.moment(order=order) - full.moment(order=order)) == 0
+    values = {p: 0.5 + i for i, p in enumerate(full.params())}
+    assert math.isclose(streamed.kurt().evalf(subs=values), full.kurt().evalf(subs=values), rel_tol=1e-9)
+
+    numeric = {k: {**v, 'translation': 0.5, 'scale': 2.0, 'beta1': 2.0, 'beta2': 3.0} for k, v in dist.items()}
+    full = PolyMoment(poly=poly, dist=numeric)
+    streamed = PolyMoment(poly=poly, dist=numeric, chunk_size=2)
+    for method in ['mean', 'var', 'skew', 'kurt']:
+        assert math.isclose(getattr(streamed, method)(), getattr(full, method)(), rel_tol=1e-9)
+
+    with pytest.raises(ValueError):
+        PolyMoment(poly=poly, dist=dist, chunk_size=0)
+
+
+def test_sharded_moment(monkeypatch):
+    """Test moments evaluated in parallel shards against the serial expansion"""
+    monkeypatch.setattr(polymoment, 'SHARD_MIN_MONOMIALS', 1)
+    dist = {
+        'x0': {'distribution': 'normal', 'type': 'symmetrical', 'translation': 'm0', 'scale': 's0'},
+        'x1': {'distribution': 'uniform', 'type': 'one_sided_right', 'translation': 'm1', 'scale': 's1'},
+    }
+    poly = 'x0**2 + 2*x0*x1 - x1 + 3'
+    serial = PolyMoment(poly=poly, dist=dist, simplify='none')
+    sharded = PolyMoment(poly=poly, dist=dist, simplify='none', workers=2)
+    expected = serial.moments(orders=[2, 4])
+    for order, moment in sharded.moments(orders=[2, 4]).items():
+        assert sympy.expand(moment - expected[order]) == 0
+
+    numeric = {k: {**v, 'translation': 0.5, 'scale': 2.0} for k, v in dist.items()}
+    sharded = PolyMoment(poly=poly, dist=numeric, workers=2)
+    assert math.isclose(sharded.kurt(), PolyMoment(poly=poly, dist=numeric).kurt(), rel_tol=1e-9)
+
+    with pytest.raises(ValueError):
+        PolyMoment(poly=poly, dist=dist, workers=2, parallel='threads')
+
+
+def test_estimate_cost():
+    """Test that estimated monomials bound the expanded powers and that symbolic parameters cost more"""
+    dist = {f'x{i}': {'distribution': 'normal', 'type': 'symmetrical', 'translation': 1, 'scale': 2}
+            for i in range(3)}
+    poly = 'x0**2 + x0*x1 + 3*x2'
+    polymoment = PolyMoment(poly=poly, dist=dist)
+    x0, x1, x2 = sympy.symbols('x0 x1 x2')
+    # x0**2 + x0*x1 and 3*x2 are expanded separately
+    parts = [sympy.Poly(x0 ** 2 + x0 * x1, x0, x1), sympy.Poly(3 * x2, x2)]
+    for order in range(1, 6):
+        estimate = polymoment.estimate_cost(order)
+        assert estimate['monomials'] >= sum(len((part ** k).terms()) for part in parts for k in range(1, order + 1))
+        assert polymoment.estimate_cost(order, central=True)['monomials'] >= estimate['monomials']
+    assert estimate['backend'] == 'numeric' and estimate['time_class'] == 'fast'
+
+    symbolic = PolyMoment(poly=poly, dist={k: {**v, 'translation': f'm{k[1]}', 'scale': f's{k[1]}'}
+                                           for k, v in dist.items()})
+    assert symbolic.estimate_cost(4)['cost'] > polymoment.estimate_cost(4)['cost']
+    # translations cancel out of centred moments
+    assert symbolic.estimate_cost(4, central=True)['parameter_terms'] == math.comb(3 + 4, 4)
+    assert symbolic.estimate_cost(4, central=True)['time_class'] == 'slow'
+    with pytest.raises(ValueError):
+        polymoment.estimate_cost(-1)
+
+
+def test_polymoment_vector():
+    """Test mean vector, covariance matrix and mixed moments of several polynomials"""
+    dist = {
+        'x0': {'distribution': 'normal', 'type': 'symmetrical', 'translation': 'm0', 'scale': 's0'},
+        'x1': {'distribution': 'uniform', 'type': 'symmetrical', 'translation': 'm1', 'scale': 's1'},
+    }
+    polys = ['x0**2 + x1', 'x0*x1', 'x1**2']
+    vector = PolyMomentVector(polys=polys, dist=dist, simplify='cheap')
+    singles = [PolyMoment(poly=poly, dist=dist, simplify='cheap') for poly in polys]
+
+    assert vector.mean() == [single.mean() for single in singles]
+    cov = vector.cov()
+    for i, single in enumerate(singles):
+        assert sympy.expand(cov[i][i] - single.var()) == 0
+
+    # var(p0 + p1) = var(p0) + var(p1) + 2 cov(p0, p1)
+    var = PolyMoment(poly=f'{polys[0]} + {polys[1]}', dist=dist, simplify='cheap').var()
+    assert sympy.expand(cov[0][1] - (var - cov[0][0] - cov[1][1]) / 2) == 0
+    assert cov[0][1] == cov[1][0]
+
+    joint = PolyMoment(poly=f'({polys[0]})**2 * {polys[2]}', dist=dist, simplify='cheap')
+    assert sympy.expand(vector.mixed_moment(0, 2, 2, 1) - joint.mean()) == 0
+    with pytest.raises(ValueError):
+        vector.mixed_moment(0, 3, 1, 1)
+
+    numeric = {k: {**v, 'translation': 1.0, 'scale': 0.5} for k, v in dist.items()}
+    assert math.isclose(PolyMomentVector(polys=['x0', 'x1'], dist=numeric).cov()[1][1], 0.25 / 3)
+
+
+def test_polymoment_vector_power_generators():
+    """Test that the covariance matrix subtracts the means when generators are powers such as sqrt(x0)"""
+    dist = {
+        'x0': {'distribution': 'uniform', 'type': 'symmetrical', 'translation': 2.0, 'scale': 1.0},
+        'x1': {'distribution': 'normal', 'type': 'symmetrical', 'translation': 1.0, 'scale': 0.5},
+    }
+    polys = ['sqrt(x0) + x1', 'x1', 'sqrt(x0)*x1']
+    cov = PolyMomentVector(polys=polys, dist=dist).cov()
+    for i, poly in enumerate(polys):
+        assert math.isclose(cov[i][i], PolyMoment(poly=poly, dist=dist).var())
+    assert math.isclose(cov[0][1], 0.25)
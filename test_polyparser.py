@@ -0,0 +1,33 @@
+import pytest
+import sympy
+
+from polyparser import InvalidPolynomial, _parse, parse_poly
+
+
+def test_parse_poly():
+    """Test parsing of polynomials in arbitrary variable names, and the cache of parsed polynomials"""
+    x0, x1, exp, pi = sympy.Symbol('x0'), sympy.Symbol('x1'), sympy.Symbol('exp'), sympy.pi
+    assert parse_poly('x0**2 + x0*x1', ['x0', 'x1']) == sympy.Poly(x0 ** 2 + x0 * x1, x0, x1)
+    assert parse_poly('x1*x0 + x0^2', ['x0', 'x1']) == parse_poly('x0**2 + x0*x1', ['x0', 'x1'])
+    # names containing x are no longer rewritten
+    assert parse_poly('max_x*exp + 3', ['max_x', 'exp']).as_expr() == sympy.Symbol('max_x') * exp + 3
+
+    # constants go to the coefficients, powers of variables are generators
+    poly = parse_poly('pi*x0 + sqrt(x0) + 1/x1', ['x0', 'x1'])
+    assert poly.gens == (x0, 1 / x1, sympy.sqrt(x0))
+    assert poly.coeff_monomial(x0) == pi
+
+    hits = _parse.cache_info().hits
+    assert parse_poly(' x0**2 + x0*x1 ', ['x0', 'x1']) is parse_poly('x0**2 + x0*x1', ['x0', 'x1'])
+    assert _parse.cache_info().hits == hits + 2
+
+
+@pytest.mark.parametrize('poly', [
+    "__import__('os').system('true')", 'x0.__class__', 'lambda: x0', "'x0'", 'x0; x1', 'x0[0]', 'x0 if x1 else 1',
+    'Symbol(x0)', 'x0 + y', '2j*x0', '0x10*x0', '', '(x0', '3', 'pi', '1/0*x0', 'x0**x1', 'E**x0', '9**9**9',
+    'x0**1000', '1/(x0 + 1)',
+])
+def test_parse_poly_rejects(poly):
+    """Test that anything but numbers, variables and arithmetic is rejected before evaluation"""
+    with pytest.raises(InvalidPolynomial):
+        parse_poly(poly, ['x0', 'x1'])
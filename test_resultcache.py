@@ -0,0 +1,54 @@
+from resultcache import ResultCache, normalize_poly, request_key
+
+
+REQUEST = {
+    'poly': 'x0**2 + x0*x1',
+    'dist': {
+        'x0': {'distribution': 'normal', 'type': 'symmetrical', 'translation': 'm0', 'scale': 's0'},
+        'x1': {'distribution': 'uniform', 'type': 'symmetrical', 'translation': 'm1', 'scale': 's1'},
+    },
+    'order': None,
+    'simplify': 'cheap',
+}
+
+
+def test_request_key():
+    """Test canonical request hash"""
+    key = request_key(request=REQUEST, method='var', version='1.0.0')
+    reordered = {**REQUEST, 'poly': 'x1*x0 + x0 ** 2', 'dist': dict(reversed(list(REQUEST['dist'].items())))}
+
+    assert request_key(request=reordered, method='var', version='1.0.0') == key
+    assert request_key(request={**REQUEST, 'order': 3}, method='var', version='1.0.0') == key
+    assert request_key(request={**REQUEST, 'order': 3}, method='moment', version='1.0.0') != \
+           request_key(request={**REQUEST, 'order': 4}, method='moment', version='1.0.0')
+    assert request_key(request=REQUEST, method='skew', version='1.0.0') != key
+    assert request_key(request={**REQUEST, 'simplify': 'full'}, method='var', version='1.0.0') != key
+    assert request_key(request=REQUEST, method='var', version='1.0.1') != key
+
+    # keys of malformed polynomials are computed without parsing them
+    assert request_key(request={**REQUEST, 'poly': 'x0 +* __import__("os")'}, method='var', version='1.0.0') != key
+
+    # whitespace separating tokens is significant: '2 3*x0' is malformed, '23*x0' is not
+    assert normalize_poly('2 3*x0') != normalize_poly('23*x0')
+    assert normalize_poly('2 * * x0') != normalize_poly('2**x0')
+    assert normalize_poly('1e -3*x0') != normalize_poly('1e-3*x0')
+    assert normalize_poly(' ( x0 + 1 ) * x1 ') == normalize_poly('x1*(x0+1)')
+
+
+def test_result_cache(tmp_path):
+    """Test in-memory and persistent tiers of the result cache"""
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = ResultCache(path=path, max_size=1, version='1.0.0')
+    assert cache.get('a') is None
+    cache.set('a', {'result': 'm0'})
+    cache.set('b', {'result': 's0**2'})
+    assert list(cache.memory) == ['b']
+    assert cache.get('a') == {'result': 'm0'}
+    assert cache.stats()['disk_hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+    # entries survive a restart, and are dropped when the version changes
+    assert ResultCache(path=path, version='1.0.0').get('b') == {'result': 's0**2'}
+    restarted = ResultCache(path=path, version='1.1.0')
+    assert restarted.get('b') is None
+    assert restarted.stats()['disk_size'] == 0
@@ -0,0 +1,50 @@
+import math
+import numpy as np
+import pickle
+import sympy
+
+from sparsepoly import SparsePoly, compositions, shard_prefixes
+
+
+def test_sparse_poly():
+    """Test sparse products and expectations against sympy polynomials"""
+    x0, x1, x2, m0 = sympy.symbols('x0 x1 x2 m0')
+    poly = sympy.Poly(x0 ** 2 - m0 * x0 * x1 + 3 * x2 - 1, x0, x1, x2)
+
+    # symbolic coefficients
+    base = SparsePoly.from_poly(poly)
+    p = base.one()
+    for _ in range(4):
+        p = p * base
+    assert p.as_poly(x0, x1, x2) == poly ** 4
+
+    # terms that cancel are dropped
+    diff = SparsePoly.from_poly(sympy.Poly(x0 - x1, x0, x1)) * SparsePoly.from_poly(sympy.Poly(x0 + x1, x0, x1))
+    assert sorted(map(tuple, diff.exps.tolist())) == [(0, 2), (2, 0)]
+
+    # E[x^k] = k + 1 for every generator
+    tables = [[k + 1 for k in range(9)]] * 3
+    expected = sum(c * math.prod(k + 1 for k in monom) for monom, c in (poly ** 4).terms())
+    assert sympy.expand(p.expectation(tables) - expected) == 0
+
+    # numeric coefficients
+    numeric = SparsePoly.from_poly(sympy.Poly(poly.as_expr().subs(m0, 2), x0, x1, x2), numeric=True)
+    p = numeric * numeric * numeric * numeric
+    assert np.isclose(p.expectation(tables), float(expected.subs(m0, 2)))
+
+
+def test_shard_prefixes():
+    """Test that shards cover every term multiplicity once and sum to the whole power expectation"""
+    for n, k, shards in [(6, 4, 3), (10, 2, 4), (3, 5, 8), (0, 3, 2), (5, 1, 3)]:
+        groups = shard_prefixes(n, k, shards)
+        assert 0 < len(groups) <= shards
+        rows = [prefix + tuple(row) for group in groups for prefix in group
+                for chunk in compositions(n - sum(prefix), k - len(prefix), 7) for row in chunk]
+        assert sorted(rows) == sorted(tuple(row) for chunk in compositions(n, k, 7) for row in chunk)
+
+    # symbolic coefficients survive pickling, as when shards are sent to other processes
+    x, y, a = sympy.symbols('x y a')
+    poly = pickle.loads(pickle.dumps(SparsePoly.from_poly(sympy.Poly(a * x + x * y / 3 + 2, x, y))))
+    tables = [[1, a, a ** 2 + 1, a ** 3, a ** 4, 5], [1, 2, 3, 4, 5, 6]]
+    shards = [poly.power_expectation(5, tables, prefixes=group) for group in shard_prefixes(5, len(poly), 3)]
+    assert sympy.expand(sympy.Add(*shards) - poly.power_expectation(5, tables)) == 0
@@ -0,0 +1,27 @@
+import json
+import pytest
+import sympy
+
+from wireformat import from_wire, to_wire
+
+
+def test_wire_format():
+    """Test that expressions survive the cse wire format exactly and shared factors are sent once"""
+    k, m, s, b = sympy.symbols('k0 m0 s0 b0')
+    g = sympy.gamma(1 + 2 / k)
+    expr = (m ** 2 * g + s * g ** 2 - sympy.Rational(3, 7) * sympy.sqrt(sympy.pi) * g) / (b + g) \
+        + sympy.Float('0.125', 30) * sympy.exp(b) + sympy.loggamma(k)
+
+    wire = json.loads(json.dumps(to_wire(expr)))
+    assert from_wire(wire) == expr
+    assert json.dumps(wire).count('gamma') == 2
+    assert from_wire(expr.__str__()) == sympy.sympify(expr.__str__())
+
+    # results given as plain numbers or symbols round trip as well
+    assert from_wire(to_wire(sympy.Integer(3))) == 3
+    assert from_wire(to_wire(m)) == m
+
+    with pytest.raises(ValueError):
+        from_wire({'format': 'cse', 'subexpressions': [], 'expr': ['__import__', 'os']})
+    with pytest.raises(ValueError):
+        from_wire({'format': 'xml'})
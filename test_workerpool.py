@@ -0,0 +1,39 @@
+import asyncio
+import math
+import os
+import pytest
+import time
+
+from workerpool import PoolBusy, TaskTimeout, WorkerPool
+
+
+def test_worker_pool():
+    """Test results, errors, time budget and queue limit of the worker pool"""
+    async def main():
+        pool = WorkerPool(size=1, max_tasks_per_child=2, max_queue=1, timeout=5)
+        try:
+            assert await pool.run(math.factorial, 5) == 120
+            with pytest.raises(ValueError):
+                await pool.run(int, 'x')
+
+            # worker is recycled after max_tasks_per_child tasks
+            pid = await pool.run(os.getpid)
+            assert await pool.run(os.getpid) == pid
+            assert await pool.run(os.getpid) != pid
+
+            # over-budget work is killed and the pool keeps serving
+            pid = await pool.run(os.getpid)
+            with pytest.raises(TaskTimeout):
+                await pool.run(time.sleep, 10, timeout=0.5)
+            assert await pool.run(os.getpid) != pid
+
+            # one task running, one waiting, the next one is rejected
+            tasks = [asyncio.ensure_future(pool.run(time.sleep, 0.5)) for _ in range(2)]
+            await asyncio.sleep(0.1)
+            with pytest.raises(PoolBusy):
+                await pool.run(os.getpid)
+            await asyncio.gather(*tasks)
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
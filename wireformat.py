@@ -0,0 +1,92 @@
+import sympy
+
+from typing import Dict, List, Union
+
+
+# result formats of the REST API: str(expr), or the common-subexpression-eliminated tree of to_wire
+FORMATS = ['text', 'cse']
+
+# operators a tree may use; anything else is rejected by from_wire
+FUNCTIONS = [
+    'Add', 'Mul', 'Pow', 'exp', 'log', 'gamma', 'loggamma', 'lowergamma', 'uppergamma', 'polygamma', 'digamma',
+    'beta', 'factorial', 'factorial2', 'binomial', 'RisingFactorial', 'FallingFactorial', 'erf', 'erfc', 'Abs',
+    'sign', 'sin', 'cos', 'tan', 'sinh', 'cosh', 'tanh', 'atan', 're', 'im',
+]
+# short codes of the most frequent operators
+CODES = {'Add': '+', 'Mul': '*', 'Pow': '^', 'Rational': '/'}
+OPERATORS = {code: name for name, code in CODES.items()}
+
+CONSTANTS = {
+    'Pi': sympy.pi, 'Exp1': sympy.E, 'ImaginaryUnit': sympy.I, 'EulerGamma': sympy.EulerGamma,
+    'Infinity': sympy.oo, 'NegativeInfinity': -sympy.oo, 'ComplexInfinity': sympy.zoo, 'NaN': sympy.nan,
+}
+
+
+def to_wire(expr) -> Dict:
+    """Structured JSON form of expr: shared subexpressions found by sympy.cse, and the reduced expression
+
+    Trees are nested lists [operator, *args], with '+', '*', '^' and '/' for Add, Mul, Pow and rationals p/q;
+    symbols are strings, integers are numbers and floats are ['Float', digits, precision]. Subexpressions are named
+    _c0, _c1, ... and may refer to the ones before them.
+    """
+    replacements, reduced = sympy.cse(sympy.sympify(expr), symbols=sympy.numbered_symbols('_c'))
+    return {
+        'format': 'cse',
+        'subexpressions': [[symbol.name, _tree(value)] for symbol, value in replacements],
+        'expr': _tree(reduced[0]),
+    }
+
+
+def from_wire(wire: Union[Dict, str]):
+    """Rebuilds the exact sympy expression of a to_wire result; plain text results are parsed with sympify"""
+    if isinstance(wire, str):
+        return sympy.sympify(wire)
+    if wire.get('format') != 'cse':
+        raise ValueError(f'Unknown wire format {wire.get("format")}')
+
+    defined = {}
+    for name, tree in wire['subexpressions']:
+        defined[name] = _build(tree, defined)
+    return _build(wire['expr'], defined)
+
+
+def format_result(expr, format: str = 'text') -> Union[str, Dict]:
+    """expr in the requested result format"""
+    if format == 'cse':
+        return to_wire(expr)
+    return expr.__str__()
+
+
+def _tree(expr) -> Union[int, str, List]:
+    if expr.is_Integer:
+        return int(expr)
+    if expr.is_Rational:
+        return ['/', int(expr.p), int(expr.q)]
+    if expr.is_Float:
+        return ['Float', str(expr), expr._prec]
+    if expr.is_Symbol:
+        return expr.name
+    if not expr.args:
+        return [type(expr).__name__]
+    name = expr.func.__name__
+    return [CODES.get(name, name)] + [_tree(arg) for arg in expr.args]
+
+
+def _build(tree, defined: Dict):
+    if isinstance(tree, bool) or not isinstance(tree, (int, str, list)) or tree == []:
+        raise ValueError(f'Malformed expression tree {tree!r}')
+    if isinstance(tree, int):
+        return sympy.Integer(tree)
+    if isinstance(tree, str):
+        return defined[tree] if tree in defined else sympy.Symbol(tree)
+
+    op, args = OPERATORS.get(tree[0], tree[0]), tree[1:]
+    if op == 'Rational':
+        return sympy.Rational(*args)
+    if op == 'Float':
+        return sympy.Float(args[0], precision=args[1])
+    if op in CONSTANTS and not args:
+        return CONSTANTS[op]
+    if op in FUNCTIONS:
+        return getattr(sympy, op)(*[_build(arg, defined) for arg in args])
+    raise ValueError(f'Operator {op} is not supported')
@@ -0,0 +1,171 @@
+import asyncio
+import contextlib
+import inspect
+import multiprocessing
+
+from typing import Callable, Union
+
+
+class TaskTimeout(Exception):
+    """Raised when a task exceeds its time budget; the worker running it has been killed"""
+
+
+class PoolBusy(Exception):
+    """Raised when too many tasks are already waiting for a worker"""
+
+
+def _worker_main(conn, initializer: Union[Callable, None] = None, initargs: tuple = ()):
+    """Worker loop: runs functions sent over conn and sends back results, generator items or errors"""
+    if initializer is not None:
+        initializer(*initargs)
+
+    while True:
+        try:
+            fn, args, kwargs = conn.recv()
+        except EOFError:
+            return
+
+        try:
+            result = fn(*args, **kwargs)
+            if inspect.isgenerator(result):
+                for item in result:
+                    conn.send(('item', item))
+                conn.send(('done', None))
+            else:
+                conn.send(('ok', result))
+        except Exception as e:
+            try:
+                conn.send(('error', e))
+            except Exception:
+                conn.send(('error', RuntimeError(repr(e))))
+
+
+class _Worker:
+    """Worker process and the parent end of its pipe"""
+    def __init__(self, context, initializer: Union[Callable, None] = None, initargs: tuple = ()):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, initializer, initargs), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        self.finished = True
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """Pool of worker processes that runs CPU-bound functions off the asyncio event loop
+
+    Every task gets a worker of its own, so a task over its time budget is stopped by killing its worker, which is
+    then replaced. Workers are also replaced after max_tasks_per_child tasks to bound memory growth, and at most
+    max_queue tasks may wait for a free worker. Every new worker calls initializer(*initargs) before its first task.
+    """
+    def __init__(self, size: int = 1, max_tasks_per_child: Union[int, None] = None,
+                 max_queue: Union[int, None] = None, timeout: Union[float, None] = None,
+                 initializer: Union[Callable, None] = None, initargs: tuple = ()):
+        self.size = size
+        self.max_tasks_per_child = max_tasks_per_child
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.waiting = 0
+        self.running = 0
+
+        self.initializer = initializer
+        self.initargs = initargs
+
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = [self._spawn() for _ in range(size)]
+        self._idle = None
+
+    async def run(self, fn: Callable, *args, timeout: Union[float, None] = None, **kwargs):
+        """Runs fn(*args, **kwargs) in a worker and returns its result"""
+        async with self._checkout(timeout) as (worker, deadline):
+            worker.conn.send((fn, args, kwargs))
+            kind, value = await self._recv(worker, deadline)
+            if kind == 'error':
+                raise value
+            return value
+
+    async def stream(self, fn: Callable, *args, timeout: Union[float, None] = None, **kwargs):
+        """Runs generator function fn(*args, **kwargs) in a worker and yields its items as they arrive
+
+        Closing the async generator early kills the worker, which stops the remaining work.
+        """
+        async with self._checkout(timeout) as (worker, deadline):
+            worker.conn.send((fn, args, kwargs))
+            while True:
+                kind, value = await self._recv(worker, deadline)
+                if kind == 'error':
+                    raise value
+                if kind == 'done':
+                    return
+                yield value
+
+    def shutdown(self):
+        """Kills every worker"""
+        for worker in self._workers:
+            worker.kill()
+        self._workers = []
+
+    def stats(self) -> dict:
+        """Pool size, running and waiting task counts"""
+        return {'size': self.size, 'running': self.running, 'waiting': self.waiting}
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._context, initializer=self.initializer, initargs=self.initargs)
+
+    @contextlib.asynccontextmanager
+    async def _checkout(self, timeout: Union[float, None]):
+        """Lends an idle worker for one task; the worker is replaced unless the task ran to completion"""
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for worker in self._workers:
+                self._idle.put_nowait(worker)
+
+        if self._idle.empty() and self.max_queue is not None and self.waiting >= self.max_queue:
+            raise PoolBusy(f'{self.waiting} tasks are already waiting for a worker')
+        self.waiting += 1
+        try:
+            worker = await self._idle.get()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        worker.finished = False
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else asyncio.get_running_loop().time() + timeout
+        try:
+            yield worker, deadline
+        finally:
+            self.running -= 1
+            worker.tasks += 1
+            if not worker.finished or (self.max_tasks_per_child and worker.tasks >= self.max_tasks_per_child):
+                worker.kill()
+                self._workers.remove(worker)
+                worker = self._spawn()
+                self._workers.append(worker)
+            self._idle.put_nowait(worker)
+
+    @staticmethod
+    async def _recv(worker: _Worker, deadline: Union[float, None]):
+        """Waits for the next message of worker without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        if not worker.conn.poll():
+            ready = loop.create_future()
+            loop.add_reader(worker.conn.fileno(), lambda: ready.done() or ready.set_result(None))
+            try:
+                await asyncio.wait_for(ready, None if deadline is None else max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                raise TaskTimeout('Computation exceeded its time budget')
+            finally:
+                loop.remove_reader(worker.conn.fileno())
+
+        try:
+            kind, value = worker.conn.recv()
+        except (EOFError, OSError):
+            kind, value = 'error', RuntimeError('Worker process terminated unexpectedly')
+        worker.finished = kind in ['ok', 'done'] or (kind == 'error' and worker.process.is_alive())
+        return kind, value